@@ -0,0 +1,44 @@
+'''
+Pre-rendered stamps for the guidance arcs.  Every arc has the same radius,
+thickness and angular extent, so the only thing that varies is the angle it
+starts at.  ArcAtlas renders a solid arc for each of n_angles quantized start
+angles up front, so that drawing an arc is a single blit.  The stamps are
+filled polygons, which avoids the holes pg.draw.arc leaves in thick arcs.
+'''
+
+import numpy as np
+import pygame as pg
+from math import pi
+
+class ArcAtlas:
+    def __init__(self, radius, thickness, extent, n_angles=360, colour="white"):
+        self.radius = radius
+        self.n_angles = n_angles
+
+        # Outline of an annular sector starting at angle 0, sampled every
+        # couple of degrees along each edge.
+        n_points = max(int(np.degrees(extent) / 2), 2)
+        thetas = np.linspace(0, extent, n_points)
+        radii = np.concatenate([np.full(n_points, radius), np.full(n_points, radius - thickness)])
+        thetas = np.concatenate([thetas, thetas[::-1]])
+
+        self.stamps = []
+        for i in range(n_angles):
+            # Like pg.draw.arc, angles are anticlockwise on screen (i.e. with y
+            # pointing up).
+            angles = thetas + 2 * pi * i / n_angles
+            points = np.column_stack([radius + radii * np.cos(angles), radius - radii * np.sin(angles)])
+
+            stamp = pg.Surface((2 * radius, 2 * radius))
+            stamp.set_colorkey((0, 0, 0), pg.RLEACCEL)
+            pg.draw.polygon(stamp, colour, points.tolist())
+            self.stamps.append(stamp)
+
+    def get(self, start_angle):
+        '''The stamp for an arc starting at start_angle (in radians).'''
+        return self.stamps[round(start_angle * self.n_angles / (2 * pi)) % self.n_angles]
+
+    def draw(self, surface, x, y, start_angle):
+        '''Blit the arc starting at start_angle, centred on (x, y), returning
+        the rect drawn to.'''
+        return surface.blit(self.get(start_angle), (x - self.radius, y - self.radius))
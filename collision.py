@@ -0,0 +1,74 @@
+'''
+Collision checks between bullets and robots.  Bullets are put into a uniform
+grid over the screen (a spatial hash) so that each robot is only tested
+against the bullets in the cells around it, rather than against every bullet.
+A bullet is tested along the whole segment it moved through during the last
+tick, so a fast one can't pass straight through a robot between ticks.
+'''
+
+from math import floor
+
+def swept_circle_hit(x0, y0, x1, y1, cx, cy, radius):
+    '''Whether the segment from (x0, y0) to (x1, y1) passes within radius of
+    (cx, cy).'''
+    dx = x1 - x0
+    dy = y1 - y0
+    length_sq = dx * dx + dy * dy
+
+    # The closest point on the segment to the centre is a fraction t of the
+    # way along it.
+    t = 0
+    if length_sq > 0:
+        t = min(max(((cx - x0) * dx + (cy - y0) * dy) / length_sq, 0), 1)
+
+    px = x0 + t * dx - cx
+    py = y0 + t * dy - cy
+    return px * px + py * py < radius * radius
+
+class SpatialHash:
+    def __init__(self, cell_size=100):
+        self.cell_size = cell_size
+
+        # Lists of items, keyed by (column, row) of the cell.
+        self.cell_dict = {}
+
+    def insert(self, item, x0, y0, x1, y1):
+        '''Add item to every cell overlapping the box with corners (x0, y0) and
+        (x1, y1).'''
+        for column in range(floor(min(x0, x1) / self.cell_size), floor(max(x0, x1) / self.cell_size) + 1):
+            for row in range(floor(min(y0, y1) / self.cell_size), floor(max(y0, y1) / self.cell_size) + 1):
+                self.cell_dict.setdefault((column, row), []).append(item)
+
+    def query(self, x, y, radius):
+        '''Return the items in every cell within radius of (x, y), each just
+        once.'''
+        found_dict = {}
+        for column in range(floor((x - radius) / self.cell_size), floor((x + radius) / self.cell_size) + 1):
+            for row in range(floor((y - radius) / self.cell_size), floor((y + radius) / self.cell_size) + 1):
+                for item in self.cell_dict.get((column, row), ()):
+                    found_dict[id(item)] = item
+        return list(found_dict.values())
+
+def get_bullet_hits(bullets, tags, radius, cell_size=100):
+    '''Return (i, tag) for each bullet (by slot index i in the SpritePool
+    bullets) which came within radius of a tag's centre while moving from its
+    previous position to its current one.  The pairs are ordered by bullet,
+    then by tag.'''
+    indices = bullets.get_indices()
+    x0 = bullets.previous_x[indices].tolist()
+    y0 = bullets.previous_y[indices].tolist()
+    x1 = bullets.x[indices].tolist()
+    y1 = bullets.y[indices].tolist()
+
+    spatial_hash = SpatialHash(cell_size)
+    for k in range(len(indices)):
+        spatial_hash.insert(k, x0[k], y0[k], x1[k], y1[k])
+
+    hits = []
+    for j, tag in enumerate(tags):
+        for k in spatial_hash.query(tag.x, tag.y, radius):
+            if swept_circle_hit(x0[k], y0[k], x1[k], y1[k], tag.x, tag.y, radius):
+                hits.append((k, j, tag))
+
+    hits.sort(key=lambda hit: hit[:2])
+    return [(int(indices[k]), tag) for k, _, tag in hits]
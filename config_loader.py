@@ -30,6 +30,20 @@ class Config:
     screen_corners = None
     calib_K = None
     calib_D = None
+    pipelined = None
+    use_remap_tables = None
+    gray_first = None
+    read_luma = None
+    tracked_detection = None
+    adaptive_detection = None
+    tiled_detection = None
+    pose_filter = None
+    cache_curves = None
+    prediction_horizon = None
+    incremental_rendering = None
+    vsync = None
+    display_rate = None
+    detection_rate = None
 
 class ConfigLoader:
     _config = None
@@ -63,6 +77,22 @@ class ConfigLoader:
             ConfigLoader._config.screen_corners.append( dict['upper_right'] )
             ConfigLoader._config.screen_corners.append( dict['lower_right'] )
             ConfigLoader._config.screen_corners.append( dict['lower_left'] )
+
+            # Optional settings, absent from older config files.
+            ConfigLoader._config.pipelined = bool(dict.get('pipelined', 0))
+            ConfigLoader._config.use_remap_tables = bool(dict.get('use_remap_tables', 0))
+            ConfigLoader._config.gray_first = bool(dict.get('gray_first', 0))
+            ConfigLoader._config.read_luma = bool(dict.get('read_luma', 0))
+            ConfigLoader._config.tracked_detection = bool(dict.get('tracked_detection', 0))
+            ConfigLoader._config.adaptive_detection = bool(dict.get('adaptive_detection', 0))
+            ConfigLoader._config.tiled_detection = bool(dict.get('tiled_detection', 0))
+            ConfigLoader._config.pose_filter = bool(dict.get('pose_filter', 0))
+            ConfigLoader._config.cache_curves = bool(dict.get('cache_curves', 0))
+            ConfigLoader._config.prediction_horizon = dict.get('prediction_horizon', 0.0)
+            ConfigLoader._config.incremental_rendering = bool(dict.get('incremental_rendering', 0))
+            ConfigLoader._config.vsync = bool(dict.get('vsync', 0))
+            ConfigLoader._config.display_rate = dict.get('display_rate', 0)
+            ConfigLoader._config.detection_rate = dict.get('detection_rate', 0)
         except:
             print('Cannot load config: %s'% config_filename)  
 
@@ -2,13 +2,15 @@
 A controller creates a curve for a robot to follow.
 '''
 
+import numpy as np
 from abc import ABC, abstractmethod
 from random import random
-from math import atan2, cos, sin, pi
+from math import atan2, cos, hypot, sin, pi
 from utils.angles import normalize_angle_pm_pi, get_smallest_signed_angular_difference
 from levels import Journey
+from curve_table import CurveTable, resample_curve
 
-from PathPlanning.DubinsPath.dubins_path_planner import plan_dubins_path
+from dubins import get_dubins_paths
 
 # This is a rather unneccessary dependency, but I like pygame's vector class.
 from pygame.math import Vector2
@@ -34,23 +36,109 @@ class AbstractController(ABC):
     def get_curve_points(self):
         pass
 
+    # Curves for a list of journeys.  Controllers that can compute several
+    # curves at once as arrays (e.g. DubinsController) override this.
+    def get_curve_points_batch(self, journeys):
+        return [self.get_curve_points(journey) for journey in journeys]
+
+    # The same curves as (n, 2) float arrays, before their points are
+    # truncated to pixels (CachedController moves curves into place before
+    # truncating them).  Controllers that compute their points in float
+    # override this; by default it is just the pixel positions.
+    def get_float_curve_points_batch(self, journeys):
+        return [np.array(points, dtype=float).reshape(-1, 2) for points in self.get_curve_points_batch(journeys)]
+
 '''
 Based on Smooth Controller 1 from 2018 notes for COMP 4766. 
 '''
 class SmoothController1(AbstractController):
-    def __init__(self):
+    def __init__(self, max_step_length=4.0, max_step_angle=0.1, max_delta_t=0.2, point_spacing=4.0, max_iterations=2000):
         self.delta_t = 0.001
         self.K_v = 1
         self.K_omega = 0.02
 
+        # Steps are sized to move at most max_step_length pixels and turn at
+        # most max_step_angle radians (and never to exceed max_delta_t).
+        # Far fewer are needed than with a fixed delta_t, which has to be tiny
+        # for the fast start yet crawls through the slow approach to the goal.
+        self.max_step_length = max_step_length
+        self.max_step_angle = max_step_angle
+        self.max_delta_t = max_delta_t
+
+        # A point is only output once the robot is at least this many pixels
+        # from the last one, which is plenty for pg.draw.lines.
+        self.point_spacing = point_spacing
+
+        # Give up (returning the curve so far) after this many steps.
+        self.max_iterations = max_iterations
+
+    def _get_velocities(self, x, y, theta, goal_x, goal_y):
+        '''Return x_dot, y_dot, omega and v for the robot at (x, y, theta).'''
+        # Get the goal position in the robot's ref. frame.
+        c = cos(theta)
+        s = sin(theta)
+        goal_rob_ref_x = c * (goal_x - x) + s * (goal_y - y)
+        goal_rob_ref_y = -s * (goal_x - x) + c * (goal_y - y)
+
+        # Smooth controller 1 (from old 4766 notes) generates the following
+        # forward and angular speeds
+        v = self.K_v * abs(goal_rob_ref_x)
+        omega = self.K_omega * goal_rob_ref_y
+
+        # Velocity in the global frame.
+        return v * c, v * s, omega, v
+
     def get_curve_points(self, journey):
-        start_pos = Vector2(journey.start_x, journey.start_y)
+        return [(int(x), int(y)) for x, y in self._get_float_curve_points(journey)]
+
+    def get_float_curve_points_batch(self, journeys):
+        return [np.array(self._get_float_curve_points(journey), dtype=float).reshape(-1, 2) for journey in journeys]
 
+    def _get_float_curve_points(self, journey):
         # Adjust the start position, by shifting it forwards to begin underneath the
         # robot's front sensor array.
         #ahead_distance = 20
         #start_pos += Vector2(ahead_distance * cos(journey.start_angle), ahead_distance * sin(journey.start_angle))
 
+        goal_x = journey.goal_x
+        goal_y = journey.goal_y
+        curve_vertex_list = [(journey.start_x, journey.start_y)]
+
+        x = last_x = journey.start_x
+        y = last_y = journey.start_y
+        theta = journey.start_angle
+
+        for _ in range(self.max_iterations):
+            if hypot(goal_x - x, goal_y - y) <= 5:
+                break
+
+            x_dot, y_dot, omega, v = self._get_velocities(x, y, theta, goal_x, goal_y)
+            delta_t = self.max_delta_t
+            if v > 0:
+                delta_t = min(delta_t, self.max_step_length / v)
+            if omega != 0:
+                delta_t = min(delta_t, self.max_step_angle / abs(omega))
+
+            # Midpoint (second order Runge-Kutta) step.
+            x_dot, y_dot, omega, _ = self._get_velocities(x + 0.5 * delta_t * x_dot, y + 0.5 * delta_t * y_dot,
+                                                          theta + 0.5 * delta_t * omega, goal_x, goal_y)
+            x += x_dot * delta_t
+            y += y_dot * delta_t
+            theta += omega * delta_t
+
+            if hypot(x - last_x, y - last_y) >= self.point_spacing:
+                curve_vertex_list.append((x, y))
+                last_x, last_y = x, y
+
+        if (last_x, last_y) != (x, y):
+            curve_vertex_list.append((x, y))
+
+        return curve_vertex_list
+
+    def get_curve_points_fixed_step(self, journey):
+        '''The original integration, with a fixed delta_t and a point for every
+        step.  Kept as the reference for smooth_controller_benchmark.py.'''
+        start_pos = Vector2(journey.start_x, journey.start_y)
         goal_pos = Vector2(journey.goal_x, journey.goal_y)
         curve_vertex_list = [(int(journey.start_x), int(journey.start_y))]
 
@@ -80,36 +168,79 @@ class SmoothController1(AbstractController):
 
         return curve_vertex_list
 
+'''
+SmoothController1's curves, looked up in a precomputed CurveTable (see
+curve_table.py) rather than integrated.  Goals closer than the table's
+smallest radius, or nearly dead behind the robot, are handed to the controller
+itself.
+'''
+class TabulatedSmoothController(AbstractController):
+    def __init__(self, table_path="smooth_controller_table", controller=None):
+        self.table = CurveTable.load(table_path)
+        self.controller = controller if controller is not None else SmoothController1()
+        self.point_spacing = self.controller.point_spacing
+
+    def get_curve_points(self, journey):
+        points = self._get_float_curve_points(journey)
+        return list(zip(points[:, 0].astype(int).tolist(), points[:, 1].astype(int).tolist()))
+
+    def get_float_curve_points_batch(self, journeys):
+        return [self._get_float_curve_points(journey) for journey in journeys]
+
+    def _get_float_curve_points(self, journey):
+        c = cos(journey.start_angle)
+        s = sin(journey.start_angle)
+        dx = journey.goal_x - journey.start_x
+        dy = journey.goal_y - journey.start_y
+        goal_rob_ref_x = c * dx + s * dy
+        goal_rob_ref_y = -s * dx + c * dy
+        if hypot(goal_rob_ref_x, goal_rob_ref_y) < self.table.radii[0]:
+            return self.controller.get_float_curve_points_batch([journey])[0]
+
+        curve = self.table.get_curve(goal_rob_ref_x, goal_rob_ref_y)
+        if curve is None:
+            return self.controller.get_float_curve_points_batch([journey])[0]
+
+        # The tabulated curve has a fixed number of points, so resample it at
+        # the controller's spacing.
+        length = np.hypot(*np.diff(curve, axis=0).T).sum()
+        curve = resample_curve(curve, max(int(length / self.point_spacing), 1) + 1)
+
+        x = journey.start_x + c * curve[:, 0] - s * curve[:, 1]
+        y = journey.start_y + s * curve[:, 0] + c * curve[:, 1]
+        return np.column_stack((x, y))
+
 '''
 Dubins model:
 https://atsushisakai.github.io/PythonRobotics/
 '''
 class DubinsController(AbstractController):
-    def __init__(self):
-        pass
+    def __init__(self, turning_radius=50.0, point_spacing=4.0):
+        self.turning_radius = turning_radius
+        self.point_spacing = point_spacing
 
     def get_curve_points(self, journey):
+        return self.get_curve_points_batch([journey])[0]
 
-        start_x = journey.start_x
-        start_y = journey.start_y
-        start_yaw = journey.start_angle
-        end_x = journey.goal_x
-        end_y = journey.goal_y
+    def get_curve_points_batch(self, journeys):
+        return [list(map(tuple, path.tolist())) for path in self._get_paths(journeys, int)]
 
-        # BAD: Journeys don't have a goal angle.  So what is a sensible value to enter here???
-        end_yaw = journey.start_angle
+    def get_float_curve_points_batch(self, journeys):
+        return self._get_paths(journeys, float)
 
-        curvature = 1/50.0
-        path_x, path_y, path_yaw, mode, _ = plan_dubins_path(
-                start_x, start_y, start_yaw, end_x, end_y, end_yaw, curvature)
+    def _get_paths(self, journeys, dtype):
+        start_x = [journey.start_x for journey in journeys]
+        start_y = [journey.start_y for journey in journeys]
+        start_yaw = [journey.start_angle for journey in journeys]
+        end_x = [journey.goal_x for journey in journeys]
+        end_y = [journey.goal_y for journey in journeys]
 
-        curve_vertex_list = []
-        for i in range(len(path_x)):
-            x = path_x[i]
-            y = path_y[i]
-            curve_vertex_list.append((int(x), int(y)))
+        # BAD: Journeys don't have a goal angle.  So what is a sensible value to enter here???
+        end_yaw = start_yaw
 
-        return curve_vertex_list
+        paths, _ = get_dubins_paths(start_x, start_y, start_yaw, end_x, end_y, end_yaw,
+                                    self.turning_radius, self.point_spacing, dtype)
+        return paths
 
 '''
 A simplified version of Dubins path planning where the movement begins with a circular arc,
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+'''
+A lookup table of SmoothController1's curves, in the spirit of
+PathPlanning/ModelPredictiveTrajectoryGenerator/lookup_table_generator.py.
+
+A curve depends only on where the goal lies in the robot's frame, so curves
+are tabulated once, offline, over a polar grid of goal positions (radii spaced
+geometrically, bearings evenly around the circle) with the robot at the origin
+facing along x.  Each curve is resampled to a fixed number of points evenly
+spaced along its length, so that neighbouring curves can be blended point by
+point.  The table is a single .npy array (memory-mapped when loaded) next to a
+small .npz describing the grid.
+
+The bearings are offset by half a step so that none lies dead behind the
+robot, where the controller doesn't turn at all and runs away from the goal.
+Goals close to dead behind aren't looked up (see get_curve).
+
+Run this script to generate the table and check it against the controller,
+or with --check just to check an existing table:
+
+    python curve_table.py [--check] [path]
+'''
+
+import sys, time
+import numpy as np
+from math import atan2, cos, floor, hypot, log, pi, sin
+
+from levels import Journey
+
+def resample_curve(points, n_points):
+    '''Return n_points (as an (n_points, 2) array) spaced evenly along the
+    polyline through points.'''
+    points = np.array(points, dtype=float).reshape(-1, 2)
+    lengths = np.concatenate(([0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))))
+    if lengths[-1] == 0:
+        return np.repeat(points[:1], n_points, axis=0)
+    samples = np.linspace(0, lengths[-1], n_points)
+    return np.column_stack((np.interp(samples, lengths, points[:, 0]), np.interp(samples, lengths, points[:, 1])))
+
+class CurveTable:
+    def __init__(self, radii, bearings, curves):
+        # curves[i, j] holds the resampled curve to the goal at radii[i] and
+        # bearings[j].
+        self.radii = radii
+        self.bearings = bearings
+        self.curves = curves
+
+        self.log_min_radius = log(radii[0])
+        self.log_radius_step = log(radii[1] / radii[0])
+        self.bearing_step = 2*pi / len(bearings)
+
+        # Whether each bearing's bin reaches dead behind the robot.
+        self.behind = pi - np.abs(bearings) <= self.bearing_step / 2 + 1e-9
+
+    @classmethod
+    def generate(cls, controller, min_radius=8, max_radius=2400, n_radii=64, n_bearings=256, n_points=128):
+        radii = np.geomspace(min_radius, max_radius, n_radii)
+        bearings = -pi + (np.arange(n_bearings) + 0.5) * 2*pi / n_bearings
+        curves = np.zeros((n_radii, n_bearings, n_points, 2), dtype=np.float32)
+
+        for i, radius in enumerate(radii):
+            journeys = [Journey(0, 0, 0, radius * cos(bearing), radius * sin(bearing)) for bearing in bearings]
+            for j, points in enumerate(controller.get_curve_points_batch(journeys)):
+                curves[i, j] = resample_curve(points, n_points)
+
+        return cls(radii, bearings, curves)
+
+    def save(self, path):
+        np.save(path + ".npy", self.curves)
+        np.savez_compressed(path + "_grid.npz", radii=self.radii, bearings=self.bearings)
+
+    @classmethod
+    def load(cls, path):
+        grid = np.load(path + "_grid.npz")
+        curves = np.load(path + ".npy", mmap_mode="r")
+        return cls(grid["radii"], grid["bearings"], curves)
+
+    def get_curve(self, goal_x, goal_y):
+        '''Return the curve (as an (n_points, 2) array) to the goal at
+        (goal_x, goal_y) in the robot's frame, blended from the four nearest
+        tabulated curves.  Goals beyond the largest radius get a scaled-up
+        curve, which is only approximate.  Returns None for a goal so nearly
+        behind the robot that one of its neighbouring bearings' bins touches
+        +-pi: either side of there the curves turn opposite ways, and can't be
+        blended.'''
+        radius = hypot(goal_x, goal_y)
+        bearing = atan2(goal_y, goal_x)
+
+        n_radii = len(self.radii)
+        u = (log(max(radius, self.radii[0])) - self.log_min_radius) / self.log_radius_step
+        u = min(u, n_radii - 1)
+        i0 = min(int(u), n_radii - 2)
+        fu = u - i0
+
+        v = (bearing - self.bearings[0]) / self.bearing_step
+        j0 = floor(v)
+        fv = v - j0
+        j0 %= len(self.bearings)
+        j1 = (j0 + 1) % len(self.bearings)
+        if self.behind[j0] or self.behind[j1]:
+            return None
+
+        curve = ((1 - fu) * (1 - fv) * self.curves[i0, j0] + (1 - fu) * fv * self.curves[i0, j1]
+                 + fu * (1 - fv) * self.curves[i0 + 1, j0] + fu * fv * self.curves[i0 + 1, j1])
+        if radius > self.radii[-1]:
+            curve *= radius / self.radii[-1]
+        return curve
+
+def check_table(tabulated_controller, controller, radii=(100, 250, 800), max_error=10.0):
+    '''Compare tabulated_controller's curves with controller's over a sweep of
+    goal bearings, most of them within a few degrees of dead behind the robot,
+    raising AssertionError if any strays by more than max_error pixels.'''
+    from smooth_controller_benchmark import max_deviation
+
+    degrees = np.concatenate((np.arange(170, 180, 0.1), np.arange(-180, -170, 0.1), np.arange(-165, 180, 15)))
+    worst_error = 0
+    for radius in radii:
+        for bearing in np.radians(degrees):
+            journey = Journey(0, 0, 0, radius * cos(bearing), radius * sin(bearing))
+            points = tabulated_controller.get_curve_points(journey)
+            reference_points = controller.get_curve_points(journey)
+
+            # Compare the curves densely, not just at their points.
+            curve = resample_curve(points, 4 * len(points) + 2)
+            reference_curve = resample_curve(reference_points, 4 * len(reference_points) + 2)
+            error = max(max_deviation(points, reference_curve), max_deviation(reference_points, curve))
+            assert error <= max_error, \
+                f"Table curve to bearing {np.degrees(bearing):.1f} at radius {radius} strays {error:.0f} px."
+            worst_error = max(worst_error, error)
+    return worst_error
+
+if __name__ == "__main__":
+
+    from controllers import SmoothController1, TabulatedSmoothController
+
+    check_only = "--check" in sys.argv[1:]
+    arguments = [argument for argument in sys.argv[1:] if argument != "--check"]
+    path = arguments[0] if arguments else "smooth_controller_table"
+
+    if not check_only:
+        start_time = time.perf_counter()
+        table = CurveTable.generate(SmoothController1())
+        table.save(path)
+        print(f"{table.curves.shape} curve table saved as {path}.npy in {time.perf_counter() - start_time:.1f} s")
+
+    worst_error = check_table(TabulatedSmoothController(path), SmoothController1())
+    print(f"check passed: table curves within {worst_error:.1f} px of the controller's")
@@ -0,0 +1,178 @@
+'''
+Chooses the AprilTag detector settings online.  Each frame is first searched
+at a reduced resolution (quad_decimate > 1), which is much cheaper.  Tags that
+were seen last frame but are missing from this coarse pass are then searched
+for again at full resolution, but only in small windows around where they
+were.  The decimation level, nthreads and decode_sharpening are adjusted to
+keep detection within a target frame time.
+'''
+
+import os, time
+from pupil_apriltags import Detector
+
+from tracked_detector import detect_in_windows
+
+# Coarse-pass settings as (quad_decimate, decode_sharpening), ordered from the
+# most expensive (and most reliable) to the cheapest.  Decoding from a
+# decimated quad benefits from a little more sharpening.
+LEVELS = [(1.0, 0.25), (1.5, 0.25), (2.0, 0.25), (2.0, 0.5), (3.0, 0.5)]
+
+def make_detector(nthreads, quad_decimate, decode_sharpening):
+    return Detector(
+       families="tag36h11",
+       nthreads=nthreads,
+       quad_decimate=quad_decimate,
+       quad_sigma=0.0,
+       refine_edges=1,
+       decode_sharpening=decode_sharpening,
+       debug=0
+    )
+
+class DetectorScheduler:
+    def __init__(self, target_frame_time=1/30, window_radius=100, adjust_interval=30, nthreads_options=None, report_interval=300):
+        self.target_frame_time = target_frame_time
+        self.window_radius = window_radius
+        self.adjust_interval = adjust_interval
+
+        # The settings and hit rates are printed every report_interval frames.
+        self.report_interval = report_interval
+        self.n_frames_reported = 0
+
+        if nthreads_options is None:
+            n_cpus = os.cpu_count() or 1
+            nthreads_options = sorted(set([1, 2, 4, n_cpus]))
+        self.nthreads_options = nthreads_options
+
+        self.level = 0
+        self.nthreads = self.nthreads_options[-1]
+
+        # Detectors are created on demand and kept, keyed by their settings.
+        self.detector_dict = {}
+
+        # Where each tag was last seen, in image coordinates.
+        self.last_centre_dict = {}
+
+        # Average detection time for each nthreads option at the current
+        # level, used to pick the fastest.
+        self.nthreads_time_dict = {}
+
+        self.frame_time_ema = None
+        self.coarse_hit_rate = None
+        self.escalation_hit_rate = None
+        self._reset_counts()
+
+    def _reset_counts(self):
+        self.n_frames = 0
+        self.frame_time_sum = 0
+        self.n_expected = 0
+        self.n_coarse_hits = 0
+        self.n_escalations = 0
+        self.n_escalation_hits = 0
+
+    def _get_detector(self, nthreads, quad_decimate, decode_sharpening):
+        key = (nthreads, quad_decimate, decode_sharpening)
+        if key not in self.detector_dict:
+            self.detector_dict[key] = make_detector(*key)
+        return self.detector_dict[key]
+
+    def detect(self, gray_image):
+        '''Drop-in replacement for Detector.detect.'''
+        start_time = time.perf_counter()
+
+        quad_decimate, decode_sharpening = LEVELS[self.level]
+        detector = self._get_detector(self.nthreads, quad_decimate, decode_sharpening)
+        raw_tags = detector.detect(gray_image)
+
+        found_ids = set(raw_tag.tag_id for raw_tag in raw_tags)
+        missing_centres = [centre for id, centre in self.last_centre_dict.items() if id not in found_ids]
+        self.n_expected += len(self.last_centre_dict)
+        self.n_coarse_hits += len(self.last_centre_dict) - len(missing_centres)
+
+        if missing_centres and quad_decimate > 1.0:
+            # Escalate to full resolution, but only where tags were expected.
+            full_detector = self._get_detector(self.nthreads, 1.0, 0.25)
+            self.n_escalations += len(missing_centres)
+            for raw_tag in detect_in_windows(full_detector, gray_image, missing_centres, self.window_radius):
+                if raw_tag.tag_id not in found_ids:
+                    raw_tags.append(raw_tag)
+                    found_ids.add(raw_tag.tag_id)
+                    self.n_escalation_hits += 1
+
+        self.last_centre_dict = {raw_tag.tag_id: tuple(raw_tag.center) for raw_tag in raw_tags}
+
+        elapsed = time.perf_counter() - start_time
+        if self.frame_time_ema is None:
+            self.frame_time_ema = elapsed
+        else:
+            self.frame_time_ema = 0.9 * self.frame_time_ema + 0.1 * elapsed
+        self.n_frames += 1
+        self.frame_time_sum += elapsed
+        if self.n_frames == self.adjust_interval:
+            self._adjust()
+
+        self.n_frames_reported += 1
+        if self.n_frames_reported == self.report_interval:
+            self.report()
+            self.n_frames_reported = 0
+
+        return raw_tags
+
+    def _adjust(self):
+        '''Called every adjust_interval frames to pick new settings.'''
+        mean_time = self.frame_time_sum / self.n_frames
+        self.nthreads_time_dict[self.nthreads] = mean_time
+
+        if self.n_expected > 0:
+            self.coarse_hit_rate = self.n_coarse_hits / self.n_expected
+        if self.n_escalations > 0:
+            self.escalation_hit_rate = self.n_escalation_hits / self.n_escalations
+        self._reset_counts()
+
+        # Try each thread count once at this level before deciding anything
+        # else, so that a slow thread count on trial doesn't push the level
+        # around.
+        untried = [n for n in self.nthreads_options if n not in self.nthreads_time_dict]
+        if untried:
+            self.nthreads = untried[0]
+            return
+
+        # Settle on the fastest thread count, and judge the level by its time.
+        self.nthreads = min(self.nthreads_time_dict, key=self.nthreads_time_dict.get)
+        best_time = self.nthreads_time_dict[self.nthreads]
+
+        # Escalations cost a second detect() call.  Frequent misses mean we'd
+        # do better with less decimation, if the time budget allows.
+        miss_rate = 1 - self.coarse_hit_rate if self.coarse_hit_rate is not None else 0
+
+        level = self.level
+        if best_time > self.target_frame_time and self.level < len(LEVELS) - 1:
+            level = self.level + 1
+        elif self.level > 0 and (best_time < 0.5 * self.target_frame_time or
+                                 (miss_rate > 0.2 and best_time < 0.8 * self.target_frame_time)):
+            level = self.level - 1
+
+        if level != self.level:
+            # Timings for the thread counts are no longer comparable, so sweep
+            # them again at the new level, starting from the current best.
+            self.level = level
+            self.nthreads_time_dict = {}
+
+    def get_metrics(self):
+        '''The current settings, and the hit rates over the last adjustment
+        interval.'''
+        quad_decimate, decode_sharpening = LEVELS[self.level]
+        return {
+            "quad_decimate": quad_decimate,
+            "decode_sharpening": decode_sharpening,
+            "nthreads": self.nthreads,
+            "frame_time_ema": self.frame_time_ema,
+            "coarse_hit_rate": self.coarse_hit_rate,
+            "escalation_hit_rate": self.escalation_hit_rate,
+        }
+
+    def report(self):
+        metrics = self.get_metrics()
+        hit_rates = ", ".join(f"{name} {metrics[name]:.2f}" if metrics[name] is not None else f"{name} -"
+                              for name in ("coarse_hit_rate", "escalation_hit_rate"))
+        print(f"detector: quad_decimate {metrics['quad_decimate']}, decode_sharpening {metrics['decode_sharpening']}, "
+              f"nthreads {metrics['nthreads']}, frame time {1000 * metrics['frame_time_ema']:.1f} ms; {hit_rates}")
@@ -0,0 +1,148 @@
+'''
+Shortest Dubins paths for many start/goal pairs at once, as used by
+DubinsController.  This follows PathPlanning/DubinsPath/dubins_path_planner.py
+(the same closed-form solutions for each of the six words), but every step is
+done on arrays over the whole batch, only the shortest word is ever sampled,
+and it is sampled straight into (by default integer) pixel positions at a
+given spacing.
+'''
+
+import numpy as np
+from math import pi
+
+# The six Dubins words, and for each of their three segments the direction of
+# turn: 1 for left, -1 for right and 0 for straight.
+WORDS = ["LSL", "RSR", "LSR", "RSL", "RLR", "LRL"]
+WORD_TURNS = np.array([[1, 0, 1], [-1, 0, -1], [1, 0, -1], [-1, 0, 1], [-1, 1, -1], [1, -1, 1]])
+
+def _mod2pi(theta):
+    return np.mod(theta, 2*pi)
+
+def get_word_lengths(alpha, beta, d):
+    '''Return an (n, 6, 3) array with the segment lengths of each word (in
+    units of the turning radius, so angles for turns) for the normalized
+    problems given by arrays alpha, beta and d.  Words that don't exist for a
+    problem have infinite lengths.'''
+    sin_a = np.sin(alpha)
+    sin_b = np.sin(beta)
+    cos_a = np.cos(alpha)
+    cos_b = np.cos(beta)
+    cos_ab = np.cos(alpha - beta)
+
+    with np.errstate(invalid="ignore"):
+        # LSL
+        p_squared = 2 + d ** 2 - 2 * cos_ab + 2 * d * (sin_a - sin_b)
+        tmp = np.arctan2(cos_b - cos_a, d + sin_a - sin_b)
+        lsl = (_mod2pi(-alpha + tmp), np.sqrt(p_squared), _mod2pi(beta - tmp))
+        lsl_valid = p_squared >= 0
+
+        # RSR
+        p_squared = 2 + d ** 2 - 2 * cos_ab + 2 * d * (sin_b - sin_a)
+        tmp = np.arctan2(cos_a - cos_b, d - sin_a + sin_b)
+        rsr = (_mod2pi(alpha - tmp), np.sqrt(p_squared), _mod2pi(-beta + tmp))
+        rsr_valid = p_squared >= 0
+
+        # LSR
+        p_squared = -2 + d ** 2 + 2 * cos_ab + 2 * d * (sin_a + sin_b)
+        straight = np.sqrt(p_squared)
+        tmp = np.arctan2(-cos_a - cos_b, d + sin_a + sin_b) - np.arctan2(-2.0, straight)
+        lsr = (_mod2pi(-alpha + tmp), straight, _mod2pi(-_mod2pi(beta) + tmp))
+        lsr_valid = p_squared >= 0
+
+        # RSL
+        p_squared = d ** 2 - 2 + 2 * cos_ab - 2 * d * (sin_a + sin_b)
+        straight = np.sqrt(p_squared)
+        tmp = np.arctan2(cos_a + cos_b, d - sin_a - sin_b) - np.arctan2(2.0, straight)
+        rsl = (_mod2pi(alpha - tmp), straight, _mod2pi(beta - tmp))
+        rsl_valid = p_squared >= 0
+
+        # The three-turn words are only ever shortest when the goal is within
+        # four turning radii.
+        near = d < 4
+
+        # RLR
+        tmp = (6.0 - d ** 2 + 2.0 * cos_ab + 2.0 * d * (sin_a - sin_b)) / 8.0
+        middle = _mod2pi(2*pi - np.arccos(tmp))
+        first = _mod2pi(alpha - np.arctan2(cos_a - cos_b, d - sin_a + sin_b) + middle / 2.0)
+        rlr = (first, middle, _mod2pi(alpha - beta - first + middle))
+        rlr_valid = near & (np.abs(tmp) <= 1.0)
+
+        # LRL
+        tmp = (6.0 - d ** 2 + 2.0 * cos_ab + 2.0 * d * (sin_b - sin_a)) / 8.0
+        middle = _mod2pi(2*pi - np.arccos(tmp))
+        first = _mod2pi(-alpha - np.arctan2(cos_a - cos_b, d + sin_a - sin_b) + middle / 2.0)
+        lrl = (first, middle, _mod2pi(_mod2pi(beta) - alpha - first + middle))
+        lrl_valid = near & (np.abs(tmp) <= 1.0)
+
+    lengths = np.array([lsl, rsr, lsr, rsl, rlr, lrl]).transpose(2, 0, 1)
+    valid = np.array([lsl_valid, rsr_valid, lsr_valid, rsl_valid, rlr_valid, lrl_valid]).T
+    lengths[~valid] = np.inf
+    return lengths
+
+def _move(x, y, yaw, turn, length, turning_radius):
+    '''Where travelling length (in units of turning_radius) from (x, y, yaw)
+    leads, turning in direction turn (0 for straight).  All arrays.'''
+    turning = turn != 0
+    end_yaw = yaw + turn * length
+    # Only used where turning, so turn is never 0 there.
+    sign = np.where(turning, turn, 1)
+    end_x = np.where(turning, x + turning_radius * sign * (np.sin(end_yaw) - np.sin(yaw)),
+                     x + turning_radius * length * np.cos(yaw))
+    end_y = np.where(turning, y - turning_radius * sign * (np.cos(end_yaw) - np.cos(yaw)),
+                     y + turning_radius * length * np.sin(yaw))
+    return end_x, end_y, end_yaw
+
+def get_dubins_paths(start_x, start_y, start_yaw, goal_x, goal_y, goal_yaw, turning_radius, spacing=4.0, dtype=int):
+    '''Return the shortest Dubins path for each start/goal pair (given as
+    arrays) as an (n_points, 2) array of pixel positions (truncated to ints
+    unless dtype is float), spaced by about spacing pixels from the start to
+    the goal.  Also returns the word chosen for each pair, as an index into
+    WORDS.'''
+    start_x = np.asarray(start_x, dtype=float)
+    start_y = np.asarray(start_y, dtype=float)
+    start_yaw = np.asarray(start_yaw, dtype=float)
+    dx = np.asarray(goal_x, dtype=float) - start_x
+    dy = np.asarray(goal_y, dtype=float) - start_y
+    n_paths = len(start_x)
+    if n_paths == 0:
+        return [], np.zeros(0, dtype=int)
+
+    # Normalize each problem to a start at the origin, a goal along the x
+    # axis, and a turning radius of 1.
+    theta = _mod2pi(np.arctan2(dy, dx))
+    alpha = _mod2pi(start_yaw - theta)
+    beta = _mod2pi(np.asarray(goal_yaw, dtype=float) - theta)
+    d = np.hypot(dx, dy) / turning_radius
+
+    word_lengths = get_word_lengths(alpha, beta, d)
+    word_indices = np.argmin(word_lengths.sum(axis=2), axis=1)
+    lengths = word_lengths[np.arange(n_paths), word_indices]
+    turns = WORD_TURNS[word_indices]
+
+    # The pose at the start of each segment, in world coordinates.
+    segment_x = np.empty((n_paths, 3))
+    segment_y = np.empty((n_paths, 3))
+    segment_yaw = np.empty((n_paths, 3))
+    x, y, yaw = start_x, start_y, start_yaw
+    for k in range(3):
+        segment_x[:, k], segment_y[:, k], segment_yaw[:, k] = x, y, yaw
+        x, y, yaw = _move(x, y, yaw, turns[:, k], lengths[:, k], turning_radius)
+
+    # Sample every path at once: each sample knows its path, and how far
+    # along it (in units of turning_radius) it is.
+    total_lengths = lengths.sum(axis=1)
+    n_samples = np.maximum(np.ceil(total_lengths * turning_radius / spacing).astype(int), 0) + 1
+    path_indices = np.repeat(np.arange(n_paths), n_samples)
+    first_samples = np.repeat(np.cumsum(n_samples) - n_samples, n_samples)
+    fractions = (np.arange(len(path_indices)) - first_samples) / np.maximum(n_samples - 1, 1)[path_indices]
+    distances = fractions * total_lengths[path_indices]
+
+    # Which segment each sample falls in, and how far along that segment.
+    segment_ends = np.cumsum(lengths, axis=1)[path_indices]
+    segments = np.minimum((distances[:, np.newaxis] > segment_ends).sum(axis=1), 2)
+    segment_starts = segment_ends[np.arange(len(segments)), segments] - lengths[path_indices, segments]
+    x, y, _ = _move(segment_x[path_indices, segments], segment_y[path_indices, segments], segment_yaw[path_indices, segments],
+                    turns[path_indices, segments], distances - segment_starts, turning_radius)
+
+    points = np.column_stack((x, y)).astype(dtype)
+    return np.split(points, np.cumsum(n_samples)[:-1]), word_indices
@@ -0,0 +1,72 @@
+'''
+Paces the main loop.  Frames are drawn at a fixed display_rate, sleeping off
+whatever time is left at the end of each one, so the loop neither spins on a
+fast machine nor changes speed with detection throughput.  Detection can be
+throttled separately to detection_rate, in which case the frames in between
+are drawn with the last detected tags.  A rate of 0 means no limit.
+'''
+
+import time
+
+class FrameScheduler:
+    def __init__(self, display_rate=30, detection_rate=0, report_interval=300):
+        self.frame_period = 1 / display_rate if display_rate > 0 else 0
+        self.detection_period = 1 / detection_rate if detection_rate > 0 else 0
+        self.report_interval = report_interval
+
+        self.next_frame_time = None
+        self.next_detection_time = None
+
+        self.report_start_time = time.monotonic()
+        self.n_frames = 0
+        self.n_detections = 0
+        self.n_late_frames = 0
+
+    def detection_due(self):
+        '''Whether it's time to run another detection.'''
+        return self.next_detection_time is None or time.monotonic() >= self.next_detection_time
+
+    def detection_done(self):
+        now = time.monotonic()
+        if self.next_detection_time is None or now - self.next_detection_time > self.detection_period:
+            self.next_detection_time = now + self.detection_period
+        else:
+            self.next_detection_time += self.detection_period
+        self.n_detections += 1
+
+    def wait_for_detection(self):
+        '''Sleep until a detection is due, then count it as done.  For use by a
+        detection thread (e.g. in pipelined mode).'''
+        if self.next_detection_time is not None:
+            remaining = self.next_detection_time - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        self.detection_done()
+
+    def wait(self):
+        '''Called at the end of each frame.  Sleeps until the next one is due.'''
+        now = time.monotonic()
+        if self.next_frame_time is None:
+            self.next_frame_time = now
+        self.next_frame_time += self.frame_period
+
+        if self.next_frame_time > now:
+            time.sleep(self.next_frame_time - now)
+        elif self.frame_period > 0:
+            # Running late.  If we've fallen more than a frame behind, start
+            # afresh rather than rushing through frames to catch up.
+            self.n_late_frames += 1
+            if now - self.next_frame_time > self.frame_period:
+                self.next_frame_time = now
+
+        self.n_frames += 1
+        if self.n_frames == self.report_interval:
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.report_start_time
+        print(f"display: {self.n_frames / elapsed:.1f} fps, detection: {self.n_detections / elapsed:.1f} fps, late frames: {self.n_late_frames}")
+        self.report_start_time = time.monotonic()
+        self.n_frames = 0
+        self.n_detections = 0
+        self.n_late_frames = 0
@@ -1,9 +1,13 @@
-import os
+import os, time
+import numpy as np
 import pygame as pg
 from pygame.math import Vector2
 from math import cos, pi, sin
-from random import random
 from levels import FirstGameLevel, VersusGameLevel, PLAYER_1_TAG_ID, RotatedTextSprite
+from latency_probe import LATENCY_MARKER_ID
+from text_cache import FontRegistry, TextSurfaceCache
+from arc_atlas import ArcAtlas
+from generators import ARC_START, ARC_END
 
 
 ARC_RADIUS = 50
@@ -11,26 +15,73 @@ ARC_THICKNESS = 30
 
 POSE_RADIUS = 65
 
+LATENCY_MARKER_SIZE = 100
+LATENCY_MARKER_MARGIN = 20
+
+# Flickering sprites are drawn as polygons whose vertices lie at random radii
+# along these directions.
+FLICKER_N_POINTS = 10
+FLICKER_DIRECTIONS = np.column_stack([np.cos(2*pi * np.arange(FLICKER_N_POINTS) / FLICKER_N_POINTS),
+                                      np.sin(2*pi * np.arange(FLICKER_N_POINTS) / FLICKER_N_POINTS)])
+
+def get_flicker_polygons(sprites):
+    '''Vertices of a freshly randomized polygon for each of the given sprites,
+    as an array of shape (len(sprites), FLICKER_N_POINTS, 2).'''
+    centres = np.array([(sprite.draw_x, sprite.draw_y) for sprite in sprites]).reshape(-1, 1, 2)
+    inner_radii = np.array([sprite.inner_radius for sprite in sprites]).reshape(-1, 1)
+    outer_radii = np.array([sprite.outer_radius for sprite in sprites]).reshape(-1, 1)
+    radii = inner_radii + np.random.random((len(sprites), FLICKER_N_POINTS)) * (outer_radii - inner_radii)
+    return centres + radii[:, :, np.newaxis] * FLICKER_DIRECTIONS
+
 class GameScreen:
-    def __init__(self, width, height, fullscreen):
+    def __init__(self, width, height, fullscreen, incremental=False, max_dirty_fraction=0.5, vsync=False):
         os.environ['SDL_VIDEO_WINDOW_POS'] = "1920,0"
         pg.init()
-        self.screen = pg.display.set_mode((width, height), flags=pg.SCALED)
+        if vsync:
+            # Not every platform can honour a vsync request.
+            try:
+                self.screen = pg.display.set_mode((width, height), flags=pg.SCALED, vsync=1)
+            except pg.error:
+                print("vsync not available.")
+                self.screen = pg.display.set_mode((width, height), flags=pg.SCALED)
+        else:
+            self.screen = pg.display.set_mode((width, height), flags=pg.SCALED)
         if fullscreen:
             pg.display.toggle_fullscreen()
         self.terminate = False
 
         self.debug_level = 1
         self.MAX_DEBUG_LEVEL = 2
-        self.font = pg.freetype.SysFont('arial', 18)
-        self.big_font = pg.freetype.SysFont('arial', 36)
+
+        # System fonts are resolved once here, and rendered text is cached.
+        self.text_cache = TextSurfaceCache(FontRegistry(["arial"]))
+
+        # Every arc has the same shape, so each is drawn as a pre-rendered stamp.
+        self.arc_atlas = ArcAtlas(ARC_RADIUS, ARC_THICKNESS, ARC_END - ARC_START)
 
         self.screenshot_index = 0
         self.do_screenshot = False
 
+        # A requested screenshot stays pending until a frame has been captured
+        # with a colour image to save alongside it (see main.py), and only
+        # then is do_screenshot set for that frame.
+        self.screenshot_pending = False
+
+        self.latency_marker = None
+        self.last_flip_time = None
+
+        # In incremental mode only the regions drawn to last frame and this
+        # frame are redrawn and pushed to the display, unless they add up to
+        # more than max_dirty_fraction of the screen.
+        self.incremental = incremental
+        self.max_dirty_fraction = max_dirty_fraction
+        self.dirty_rects = []
+        self.last_dirty_rects = None
+
     def handle_events(self):
         self.movement = {"p1": "", "p2": ""}
         self.restart = False
+        self.start_latency_probe = False
 
         # Handle events, including key-presses that occur when the key is
         # pressed down, but not subsequently.
@@ -40,13 +91,15 @@ class GameScreen:
             if event.type == pg.KEYDOWN:
                 if event.key == pg.K_r:
                     self.restart = True
+                if event.key == pg.K_l:
+                    self.start_latency_probe = True
                 #if event.key == pg.K_d:
                 #     if self.debug_level < self.MAX_DEBUG_LEVEL:
                 #         self.debug_level += 1
                 #     else:
                 #         self.debug_level = 0
                 # if event.key == pg.K_s:
-                #     self.do_screenshot = True
+                #     self.screenshot_pending = True
 
         # Handle key presses (key could be held down).
         keys = pg.key.get_pressed()
@@ -92,103 +145,123 @@ class GameScreen:
     def get_restart(self):
         return self.restart
 
-    def update(self, wow_tags, control_arcs, control_curves, sprites, background_image=None, game_over=False, level=None):
+    def get_start_latency_probe(self):
+        return self.start_latency_probe
+
+    def draw_latency_marker(self):
+        if self.latency_marker is None:
+            tag_image = pg.image.load(f"tag36h11/tag36_11_{LATENCY_MARKER_ID:05}.png").convert()
+            self.latency_marker = pg.transform.scale(tag_image, (LATENCY_MARKER_SIZE, LATENCY_MARKER_SIZE))
+        return self.screen.blit(self.latency_marker, (LATENCY_MARKER_MARGIN, LATENCY_MARKER_MARGIN))
+
+    def update(self, wow_tags, control_arcs, control_curves, sprites, background_image=None, game_over=False, level=None, show_latency_marker=False):
+        # Every draw below adds the rect it touched to dirty_rects.  In
+        # incremental mode we only wipe and push last frame's and this frame's
+        # rects, rather than the whole screen.
+        self.dirty_rects = []
+        full_update = not self.incremental or background_image is not None or self.last_dirty_rects is None
+
         if background_image is not None:
             pg.surfarray.blit_array(self.screen, background_image)
-        else:
+        elif full_update:
             # Fill the screen to wipe away anything from last frame
             self.screen.fill("black")
+        else:
+            for rect in self.last_dirty_rects:
+                self.screen.fill("black", rect)
 
         if self.debug_level > 0:
-            for wow_tag in wow_tags:
-                centre = Vector2(wow_tag.x, wow_tag.y)
-                unit_vector = Vector2(cos(wow_tag.angle), sin(wow_tag.angle))
+            for id, x, y, angle in wow_tags.unique().rows():
+                centre = Vector2(x, y)
+                unit_vector = Vector2(cos(angle), sin(angle))
 
                 if isinstance(level, VersusGameLevel):
-                    shield_count = level.shields.get(wow_tag.id, 0)
-                    if shield_count > 0 and wow_tag.id not in level.graveyard_list:
+                    shield_count = level.shields.get(id, 0)
+                    if shield_count > 0 and id not in level.graveyard_list:
                         for i in range(shield_count):
                             outer_radius = POSE_RADIUS + 10 + (shield_count - i - 1) * 6
                             inner_radius = outer_radius - 2  
-                            pg.draw.circle(self.screen, (0, 255, 255), centre, outer_radius, width=2)
-                            pg.draw.circle(self.screen, (0, 0, 0), centre, inner_radius)
+                            self.dirty_rects.append(pg.draw.circle(self.screen, (0, 255, 255), centre, outer_radius, width=2))
+                            self.dirty_rects.append(pg.draw.circle(self.screen, (0, 0, 0), centre, inner_radius))
                     
-                    if wow_tag.id == PLAYER_1_TAG_ID:
+                    if id == PLAYER_1_TAG_ID:
                         color = "blue"
                     else:
                         color = "red"            
                 elif isinstance(level, FirstGameLevel):
-                    if wow_tag.id == PLAYER_1_TAG_ID:
+                    if id == PLAYER_1_TAG_ID:
                         color = "blue"
                     else:
                         color = "purple"  
                 else:
                     color = "purple"
 
-                pg.draw.circle(self.screen, color, centre, POSE_RADIUS, width=2)
-                pg.draw.line(self.screen, color, centre + 0.7 * POSE_RADIUS * unit_vector, centre + POSE_RADIUS * unit_vector, width=3)
+                self.dirty_rects.append(pg.draw.circle(self.screen, color, centre, POSE_RADIUS, width=2))
+                self.dirty_rects.append(pg.draw.line(self.screen, color, centre + 0.7 * POSE_RADIUS * unit_vector, centre + POSE_RADIUS * unit_vector, width=3))
 
                 if self.debug_level == 1:
-                    text_surface, rect = self.font.render(str(wow_tag.id), color)
+                    text_surface = self.text_cache.render(str(id), color, 18)
                 elif self.debug_level == 2:
                     newline = '\n'
-                    text_surface, rect = self.font.render(f"id: {wow_tag.id}{newline}pos: {wow_tag.x, wow_tag.y}{newline}angle: {int(wow_tag.angle*180/pi)}", "purple")
+                    text_surface = self.text_cache.render(f"id: {id}{newline}pos: {x, y}{newline}angle: {int(angle*180/pi)}", "purple", 18)
 
-                text_position = centre + 1.2 * POSE_RADIUS * unit_vector - 0.5 * Vector2(rect.width, rect.height)
-                self.screen.blit(text_surface, text_position)
+                text_position = centre + 1.2 * POSE_RADIUS * unit_vector - 0.5 * Vector2(text_surface.get_size())
+                self.dirty_rects.append(self.screen.blit(text_surface, text_position))
+
+        # The polygons for all flickering sprites are generated in one go.
+        flicker_sprites = [sprite for sprite in sprites if not hasattr(sprite, "text") and sprite.flicker]
+        flicker_polygons = iter(get_flicker_polygons(flicker_sprites).tolist())
 
         for sprite in sprites:
             if isinstance(sprite, RotatedTextSprite):
-                font = pg.freetype.SysFont("arial", sprite.font_size, bold=True)
-                text_surface, _ = font.render(sprite.text, sprite.colour)
-                text_surface = pg.transform.rotate(text_surface, sprite.angle)
+                text_surface = self.text_cache.render(sprite.text, sprite.colour, sprite.font_size, bold=True, angle=sprite.angle)
                 rect = text_surface.get_rect(center=(sprite.centre_vec.x, sprite.centre_vec.y))
-                self.screen.blit(text_surface, rect)
+                self.dirty_rects.append(self.screen.blit(text_surface, rect))
                 continue
             if hasattr(sprite, "text"):
                     font_size = getattr(sprite, "font_size", None)
                     if font_size is None:
                         font_size = 36
-                    font = pg.freetype.SysFont("arial", font_size, bold=True)
-                    text_surface, rect = font.render(sprite.text, sprite.colour, size=font_size)
-                    text_pos = Vector2(sprite.centre_vec.x, sprite.centre_vec.y) - 0.5 * Vector2(rect.width, rect.height)
+                    text_surface = self.text_cache.render(sprite.text, sprite.colour, font_size, bold=True)
+                    text_pos = Vector2(sprite.centre_vec.x, sprite.centre_vec.y) - 0.5 * Vector2(text_surface.get_size())
 
-                    self.screen.blit(text_surface, text_pos)
+                    self.dirty_rects.append(self.screen.blit(text_surface, text_pos))
             else:
+                centre = (sprite.draw_x, sprite.draw_y)
                 if sprite.flicker:
-                    n_points = 10
-                    points = []
-                    for i in range(n_points):
-                        angle = 2*pi * i / n_points
-                        radius = sprite.inner_radius + random() * (sprite.outer_radius - sprite.inner_radius)
-                        points.append(Vector2(sprite.centre_vec.x + radius * cos(angle), \
-                                            sprite.centre_vec.y + radius * sin(angle)))
-                    pg.draw.polygon(self.screen, sprite.colour, points)
+                    self.dirty_rects.append(pg.draw.polygon(self.screen, sprite.colour, next(flicker_polygons)))
                 else:
-                    pg.draw.circle(self.screen, sprite.colour, Vector2(sprite.centre_vec.x, sprite.centre_vec.y), sprite.outer_radius)
+                    self.dirty_rects.append(pg.draw.circle(self.screen, sprite.colour, centre, sprite.outer_radius))
 
                 # Fill the centre with black, so in the case of flames on a dying
                 # robot, it doesn't trigger movement.
-                pg.draw.circle(self.screen, "black", Vector2(sprite.centre_vec.x, sprite.centre_vec.y), sprite.inner_radius)
+                self.dirty_rects.append(pg.draw.circle(self.screen, "black", centre, sprite.inner_radius))
 
         for arc in control_arcs:
-            # Setting a non-zero width in the arc function leaves holes.  We fill these in
-            # by drawing it multiple times at slightly shifted positions.
-            rect = pg.Rect(arc.start_x - ARC_RADIUS, arc.start_y - ARC_RADIUS, 2*ARC_RADIUS, 2*ARC_RADIUS)
-            pg.draw.arc(self.screen, "white", rect, arc.start_angle, arc.stop_angle, width=ARC_THICKNESS)
-            pg.draw.arc(self.screen, "white", rect.move(0,1), arc.start_angle, arc.stop_angle, width=ARC_THICKNESS)
-            pg.draw.arc(self.screen, "white", rect.move(1,0), arc.start_angle, arc.stop_angle, width=ARC_THICKNESS)
-            pg.draw.arc(self.screen, "white", rect.move(1,1), arc.start_angle, arc.stop_angle, width=ARC_THICKNESS)
+            self.dirty_rects.append(self.arc_atlas.draw(self.screen, arc.start_x, arc.start_y, arc.start_angle))
 
         for curve in control_curves:
-            pg.draw.lines(self.screen, "white", False, curve, 20)
+            self.dirty_rects.append(pg.draw.lines(self.screen, "white", False, curve, 20))
         
         if game_over:
-            for wow_tag in wow_tags:
-                centre = Vector2(wow_tag.x, wow_tag.y)
-                pg.draw.circle(self.screen, "black", centre, POSE_RADIUS - 5)
+            for _, x, y, _ in wow_tags.unique().rows():
+                self.dirty_rects.append(pg.draw.circle(self.screen, "black", (x, y), POSE_RADIUS - 5))
+
+        if show_latency_marker:
+            self.dirty_rects.append(self.draw_latency_marker())
 
-        pg.display.flip()
+        if not full_update:
+            update_rects = self.last_dirty_rects + self.dirty_rects
+            dirty_area = sum(rect.width * rect.height for rect in update_rects)
+            if dirty_area > self.max_dirty_fraction * self.screen.get_width() * self.screen.get_height():
+                full_update = True
+
+        if full_update:
+            pg.display.flip()
+        else:
+            pg.display.update(update_rects)
+        self.last_flip_time = time.monotonic()
+        self.last_dirty_rects = self.dirty_rects
 
         if self.do_screenshot:
             filename = f"screenshots/screen_{self.screenshot_index:02}.png"
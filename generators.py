@@ -1,8 +1,9 @@
-import cv2
+import cv2, time
 import numpy as np
-from scipy import ndimage
-from math import atan2, pi
+from collections import OrderedDict
+from math import atan2, cos, sin, pi
 from utils.angles import get_smallest_signed_angular_difference, normalize_angle_0_2pi, normalize_angle_pm_pi
+from levels import Journey
 
 # This is a rather unneccessary dependency, but I like pygame's vector class.
 from pygame.math import Vector2
@@ -18,58 +19,172 @@ class Arc:
         self.start_angle = start_angle
         self.stop_angle = stop_angle
 
+'''
+Wraps a controller, memoizing its curves.  A robot's curve depends only on
+where its goal lies relative to it (the controllers are unchanged by moving or
+rotating everything together), so each curve is computed in a canonical frame
+with the robot at the origin facing along x, keyed on the goal's quantized
+position in that frame.  From frame to frame a robot that barely moves keeps
+the same key, and the cached curve is just rotated and translated onto it.
+Canonical curves are kept in float, and only truncated to pixels once in
+place, so that truncation errors aren't rotated along with them.
+Curves are evicted least recently used first.
+'''
+class CachedController:
+    def __init__(self, controller, position_quantum=2.0, max_entries=256):
+        self.controller = controller
+        self.position_quantum = position_quantum
+        self.max_entries = max_entries
+
+        # Canonical curves as (n, 2) float arrays, keyed by (controller
+        # parameters, quantized goal x, quantized goal y), in least- to
+        # most-recently used order.
+        self.curve_dict = OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def _get_parameters(self):
+        '''The controller's numeric settings, so that changing any of them
+        doesn't return stale curves.'''
+        return tuple(sorted((name, value) for name, value in vars(self.controller).items()
+                            if isinstance(value, (int, float))))
+
+    def _get_key(self, parameters, journey):
+        # The goal in the robot's frame, snapped to the grid.
+        c = cos(journey.start_angle)
+        s = sin(journey.start_angle)
+        dx = journey.goal_x - journey.start_x
+        dy = journey.goal_y - journey.start_y
+        goal_rob_ref_x = c * dx + s * dy
+        goal_rob_ref_y = -s * dx + c * dy
+        return (parameters, round(goal_rob_ref_x / self.position_quantum), round(goal_rob_ref_y / self.position_quantum))
+
+    def _to_world(self, curve, journey):
+        '''Rotate and translate a canonical curve onto the journey's start.'''
+        if len(curve) == 0:
+            return []
+        c = cos(journey.start_angle)
+        s = sin(journey.start_angle)
+        x = journey.start_x + c * curve[:, 0] - s * curve[:, 1]
+        y = journey.start_y + s * curve[:, 0] + c * curve[:, 1]
+        return list(zip(x.astype(int).tolist(), y.astype(int).tolist()))
+
+    def get_curve_points(self, journey):
+        return self.get_curve_points_batch([journey])[0]
+
+    def get_curve_points_batch(self, journeys):
+        parameters = self._get_parameters()
+        keys = [self._get_key(parameters, journey) for journey in journeys]
+
+        # Compute the missing curves together, each from the centre of its
+        # key's grid cell.
+        missing_keys = list(dict.fromkeys(key for key in keys if key not in self.curve_dict))
+        missing_journeys = [Journey(0, 0, 0, key[1] * self.position_quantum, key[2] * self.position_quantum)
+                            for key in missing_keys]
+        for key, curve in zip(missing_keys, self.controller.get_float_curve_points_batch(missing_journeys)):
+            self.curve_dict[key] = curve
+        self.n_misses += len(missing_keys)
+        self.n_hits += len(keys) - len(missing_keys)
+
+        curves = []
+        for key, journey in zip(keys, journeys):
+            self.curve_dict.move_to_end(key)
+            curves.append(self._to_world(self.curve_dict[key], journey))
+
+        while len(self.curve_dict) > self.max_entries:
+            self.curve_dict.popitem(last=False)
+        return curves
+
 '''
 This one generates a list of arcs and curves corresponding to the controller's
 action for each tag.
 '''
 class CurveArcGenerator:
-    def __init__(self, controller):
+    def __init__(self, controller, pose_filter=None, latency=0.0):
         self.controller = controller
+        self.set_projection(pose_filter, latency)
+
+        # The journey the level gave for each tag id last frame.  The levels
+        # replace a robot's Journey whenever they restart it, so one that
+        # isn't the same object as last frame's was started this frame.
+        self.last_journey_dict = {}
+
+    def set_projection(self, pose_filter, latency):
+        '''Given a TagPoseFilter, each robot's pose is projected forwards by
+        latency seconds (the glass-to-glass latency), so that the guidance is
+        drawn for where the robot will be when it appears on screen.  Without
+        a filter there is nothing to project with, so latency must be 0.'''
+        if pose_filter is None and latency:
+            raise ValueError("latency can only be compensated for with a pose_filter")
+        self.pose_filter = pose_filter
+        self.latency = latency
 
     def generate(self, wow_tags, journey_dict):
         arcs = []
-        curves = []
-        for wow_tag in wow_tags:
-            id = wow_tag.id
-            if not id in journey_dict:
+        curve_journeys = []
+
+        projected_tags = None
+        if self.pose_filter is not None:
+            projected_tags = self.pose_filter.predict(time.monotonic() + self.latency)
+
+        # Each robot with a journey is looked up in the frame's index, so a tag
+        # detected twice is only used once.
+        tag_rows = list(wow_tags.rows())
+        if projected_tags is not None:
+            projected_rows = list(projected_tags.rows())
+
+        for id, journey in journey_dict.items():
+            row = wow_tags.index.get(id)
+            if row is None:
                 continue
+            _, x, y, angle = tag_rows[row]
 
-            journey = journey_dict[id]
-            alpha = get_smallest_signed_angular_difference(wow_tag.angle, atan2(journey.goal_y - wow_tag.y, journey.goal_x - wow_tag.x))
-            #alpha = atan2(journey.goal_y - wow_tag.y, journey.goal_x - wow_tag.x) - wow_tag.angle
+            is_new_journey = journey is not self.last_journey_dict.get(id)
+
+            if projected_tags is not None and id in projected_tags:
+                _, x, y, angle = projected_rows[projected_tags.index[id]]
+                # A journey the level started from the robot's measured pose
+                # this frame is started from its projected pose instead.
+                if is_new_journey:
+                    journey = Journey(x, y, angle, journey.goal_x, journey.goal_y)
+            alpha = get_smallest_signed_angular_difference(angle, atan2(journey.goal_y - y, journey.goal_x - x))
+            #alpha = atan2(journey.goal_y - y, journey.goal_x - x) - angle
             #alpha = normalize_angle_pm_pi(alpha)
 
             if abs(alpha) < pi/8:
-                # Generate curve for this tag.
-                points = self.controller.get_curve_points(journey_dict[id])
-                curves.append(points)
+                # Generate curve for this tag (below, along with the others).
+                curve_journeys.append(journey)
 
             else:
                 # Generate arc.  The following ridiculous normalizing and sign-flipping is all to
                 # satisfy pygame's arc drawing function.
-                # start_angle = normalize_angle_0_2pi(-wow_tag.angle)
-                # stop_angle = normalize_angle_0_2pi(-wow_tag.angle + alpha)
+                # start_angle = normalize_angle_0_2pi(-angle)
+                # stop_angle = normalize_angle_0_2pi(-angle + alpha)
                 # if start_angle < stop_angle:
-                #     arc = Arc(wow_tag.x, wow_tag.y, start_angle, stop_angle)
+                #     arc = Arc(x, y, start_angle, stop_angle)
                 # else:
-                #     arc = Arc(wow_tag.x, wow_tag.y, stop_angle, start_angle)
+                #     arc = Arc(x, y, stop_angle, start_angle)
                 # arcs.append(arc)
 
-                start_angle = normalize_angle_0_2pi(-wow_tag.angle)
+                start_angle = normalize_angle_0_2pi(-angle)
                 #print(f"alpha: {alpha} , start_angle: {start_angle}")
                 if alpha < 0:
-                    arc = Arc(wow_tag.x, wow_tag.y, start_angle - ARC_END, start_angle - ARC_START)
+                    arc = Arc(x, y, start_angle - ARC_END, start_angle - ARC_START)
                 else:
-                    arc = Arc(wow_tag.x, wow_tag.y, start_angle + ARC_START, start_angle + ARC_END)
+                    arc = Arc(x, y, start_angle + ARC_START, start_angle + ARC_END)
                 arcs.append(arc)
 
                 # While we're in the mode of generating arcs, we're not using the journey's start angle 
                 # or start position---those may also be growing "stale" as the robot shifts.  We'll
                 # constantly update them here, but they'll remain fixed once the angle to the goal
                 # goes under the threshold.
-                journey.start_x = wow_tag.x
-                journey.start_y = wow_tag.y
-                journey.start_angle = wow_tag.angle
+                journey = journey_dict[id]
+                journey.start_x = x
+                journey.start_y = y
+                journey.start_angle = angle
+
+        self.last_journey_dict = dict(journey_dict)
+        curves = self.controller.get_curve_points_batch(curve_journeys)
 
         return arcs, curves
 
@@ -77,41 +192,71 @@ class CurveArcGenerator:
 This one generates an image with control curves already drawn.
 '''
 class GuidanceImageGenerator:
-    def __init__(self, width, height, controller):
+    def __init__(self, width, height, controller, dilation=10):
         self.width = width
         self.height = height
         self.controller = controller
 
+        # Curve points are thickened by a dilation x dilation square, reaching
+        # dilation // 2 pixels before each point and the rest after it (as
+        # ndimage.grey_dilation does).
+        self.kernel = np.ones((dilation, dilation), np.uint8)
+        self.reach_before = dilation // 2
+        self.reach_after = dilation - dilation // 2 - 1
+
+        # Creating this image with width rows and height columns to match
+        # pygame, even though its in violation of normal numpy convention.
+        # It is reused from frame to frame, with only the regions drawn to
+        # last time cleared.
+        self.image = np.zeros((width, height), dtype=np.uint32)
+        self.last_boxes = []
+
     def generate(self, wow_tags, journey_dict):
-        curves = []
-        for wow_tag in wow_tags:
-            id = wow_tag.id
-            if not id in journey_dict:
+        curve_journeys = []
+        tag_rows = list(wow_tags.rows())
+        for id, journey in journey_dict.items():
+            row = wow_tags.index.get(id)
+            if row is None:
                 continue
-
-            journey = journey_dict[id]
+            _, x, y, angle = tag_rows[row]
 
             # The journey's start angle or start position may be growing "stale" as the robot shifts.
-            journey.start_x = wow_tag.x
-            journey.start_y = wow_tag.y
-            journey.start_angle = wow_tag.angle
+            journey.start_x = x
+            journey.start_y = y
+            journey.start_angle = angle
 
-            #alpha = get_smallest_signed_angular_difference(wow_tag.angle, atan2(journey.goal_y - wow_tag.y, journey.goal_x - wow_tag.x))
+            #alpha = get_smallest_signed_angular_difference(angle, atan2(journey.goal_y - y, journey.goal_x - x))
 
-            # Generate curve for this tag.
-            points = self.controller.get_curve_points(journey)
-            curves.append(points)
+            curve_journeys.append(journey)
 
-        # Creating this image with width rows and height columns to match
-        # pygame, even though its in violation of normal numpy convention
-        image = np.zeros((self.width, self.height))
+        # Generate curves for all the tags together.
+        curves = self.controller.get_curve_points_batch(curve_journeys)
+
+        for x0, y0, x1, y1 in self.last_boxes:
+            self.image[x0:x1, y0:y1] = 0
+
+        # Each curve is drawn and dilated within its own bounding box (padded
+        # by the dilation's reach), rather than dilating the whole image.
+        boxes = []
         for curve in curves:
-            for x, y in curve:
-                if x < 0 or x >= self.width or y < 0 or y >= self.height:
-                    continue
-                else:
-                    image[x, y] = 2**32 - 1
+            points = np.array(curve, dtype=int).reshape(-1, 2)
+            inside = (points[:, 0] >= 0) & (points[:, 0] < self.width) & (points[:, 1] >= 0) & (points[:, 1] < self.height)
+            points = points[inside]
+            if len(points) == 0:
+                continue
+
+            x0 = max(points[:, 0].min() - self.reach_before, 0)
+            y0 = max(points[:, 1].min() - self.reach_before, 0)
+            x1 = min(points[:, 0].max() + self.reach_after + 1, self.width)
+            y1 = min(points[:, 1].max() + self.reach_after + 1, self.height)
+
+            window = np.zeros((x1 - x0, y1 - y0), dtype=np.uint8)
+            window[points[:, 0] - x0, points[:, 1] - y0] = 1
+            window = cv2.dilate(window, self.kernel, anchor=(self.reach_after, self.reach_after))
+            self.image[x0:x1, y0:y1][window > 0] = 2**32 - 1
+            boxes.append((x0, y0, x1, y1))
 
-        image = ndimage.grey_dilation(image, size=(10, 10))
+        self.last_boxes = boxes
 
-        return image
\ No newline at end of file
+        # Note that the same array is returned every frame.
+        return self.image
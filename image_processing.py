@@ -1,37 +1,198 @@
-import cv2
+import cv2, hashlib, os, time
 import numpy as np
 from scipy import interpolate
 
-def capture_and_preprocess(cap, cfg, homography=None):
-    ret, image = cap.read()
+from config_loader import calib_dir
+
+def capture_and_preprocess(cap, cfg, homography=None, remap=None, gray_first=False, want_colour=True):
+    image = capture(cap, cfg)
+    if image is None:
+        return None, None
+    return preprocess(image, cfg, homography=homography, remap=remap,
+                      gray_first=gray_first, want_colour=want_colour)
+
+def capture(cap, cfg):
+    '''Grab a raw frame from the camera.  This is normally a BGR image, but
+    with CAP_PROP_CONVERT_RGB turned off it is whatever the backend delivers
+    (see to_gray and to_bgr).'''
+    image, capture_time = capture_timestamped(cap, cfg)
+    return image
+
+def capture_timestamped(cap, cfg):
+    '''As capture, but also returns when the frame was captured, in
+    time.monotonic() seconds (see grab_timestamped).'''
+    capture_time = grab_timestamped(cap)
+    if capture_time is None:
+        return None, None
+    return retrieve(cap), capture_time
+
+def grab_timestamped(cap):
+    '''Grab the camera's next frame without decoding it, returning when it
+    was captured in time.monotonic() seconds, or None on failure.  If the
+    backend reports frame times (CAP_PROP_POS_MSEC) these are used, mapped
+    onto the monotonic clock by the smallest offset seen so far, which is
+    steadier than timing the grab.  Otherwise it is the monotonic time at
+    which the grab returned.'''
+    if not cap.grab():
+        print('Cannot read video.')
+        return None
+    grab_time = time.monotonic()
+
+    pos_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if pos_msec > 0:
+        offset = grab_time - pos_msec / 1000
+        if capture_timestamped.offset is None or offset < capture_timestamped.offset:
+            capture_timestamped.offset = offset
+        return pos_msec / 1000 + capture_timestamped.offset
+
+    return grab_time
+
+def retrieve(cap):
+    '''Decode the frame last grabbed, or return None on failure.'''
+    ret, image = cap.retrieve()
+    if not ret:
+        print('Cannot read video.')
+        return None
+    return image
+
+# The smallest difference seen between the monotonic clock and the backend's
+# frame times.
+capture_timestamped.offset = None
+
+def _check_size(image, cfg):
+    '''Resize to the configured input size if the backend ignored our
+    request.'''
     h, w = image.shape[:2]
     if w != cfg.input_width or h != cfg.input_height:
         if not capture_and_preprocess.warned:
             print("cv2 is ignoring the specified width/height. Resizing...")
             capture_and_preprocess.warned = True
         image = cv2.resize(image, (cfg.input_width, cfg.input_height))
-    if not ret:
-        print('Cannot read video.')
-        return None, None
+    return image
+
+def _is_encoded(image):
+    # Unconverted MJPEG frames arrive as a single row of compressed bytes.
+    return image.ndim == 2 and image.shape[0] == 1
+
+def to_gray(image, cfg):
+    '''Single-channel version of a raw frame.  For unconverted frames this
+    avoids producing colour at all: YUYV frames (two channels) already hold
+    the luma plane in channel 0, and MJPEG frames are decoded straight to
+    grayscale.'''
+    if _is_encoded(image):
+        image = cv2.imdecode(image, cv2.IMREAD_GRAYSCALE)
+    elif image.ndim == 3 and image.shape[2] == 2:
+        image = image[:, :, 0]
+    elif image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return _check_size(image, cfg)
+
+def to_bgr(image, cfg):
+    '''BGR version of a raw frame.'''
+    if _is_encoded(image):
+        image = cv2.imdecode(image, cv2.IMREAD_COLOR)
+    elif image.ndim == 3 and image.shape[2] == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_YUV2BGR_YUYV)
+    return _check_size(image, cfg)
+
+def undistort_and_warp(image, cfg, homography=None, remap=None):
+    '''Undistort and (optionally) warp an image with any number of
+    channels.  If a FusedRemap is given, it does both in one pass and
+    homography is ignored (it was baked into the remap tables).'''
+    if remap is not None:
+        return remap.apply(image)
+
+    h, w = image.shape[:2]
 
     # Undistort the raw image.
     newcameramtx, roi = cv2.getOptimalNewCameraMatrix(cfg.calib_K, cfg.calib_D, (w,h), 1, (w,h))
     undistorted = cv2.undistort(image, cfg.calib_K, cfg.calib_D, None, newcameramtx)
 
     # Warp the raw image.
-    warped_image = None
     if homography is not None:
-        warped_image = cv2.warpPerspective(undistorted, homography, (cfg.output_width, cfg.output_height))
+        return cv2.warpPerspective(undistorted, homography, (cfg.output_width, cfg.output_height))
+    else:
+        return undistorted
 
-        return cv2.cvtColor(warped_image, cv2.COLOR_BGR2GRAY), warped_image
+def preprocess(image, cfg, homography=None, remap=None, gray_first=False, want_colour=True):
+    '''Undistort and (optionally) warp a raw frame.  Returns the grayscale
+    image for detection and the warped colour image (None without a
+    homography).
+
+    With gray_first, the frame is reduced to one channel before undistorting
+    and warping, which then touch a third of the bytes.  The colour image is
+    only produced if want_colour is set (e.g. for a screenshot).'''
+    if remap is not None:
+        warped = remap.homography is not None
     else:
+        warped = homography is not None
 
-        return cv2.cvtColor(undistorted, cv2.COLOR_BGR2GRAY), None
+    if not gray_first:
+        transformed = undistort_and_warp(to_bgr(image, cfg), cfg, homography, remap)
+        gray_image = cv2.cvtColor(transformed, cv2.COLOR_BGR2GRAY)
+        if warped:
+            return gray_image, transformed
+        else:
+            return gray_image, None
+
+    gray_image = undistort_and_warp(to_gray(image, cfg), cfg, homography, remap)
+    warped_image = None
+    if warped and want_colour:
+        warped_image = undistort_and_warp(to_bgr(image, cfg), cfg, homography, remap)
+    return gray_image, warped_image
 
 # An attribute to the above function just so that we display the resize warning
 # only once.
 capture_and_preprocess.warned = False
 
+class FusedRemap:
+    '''Undistortion and the screen homography composed into a single lookup
+    table, so that each frame needs one cv2.remap instead of cv2.undistort
+    followed by cv2.warpPerspective.  The tables are built once (in
+    fixed-point CV_16SC2 form) and cached in the calibration directory, keyed
+    by a hash of everything they depend on.'''
+    def __init__(self, cfg, homography=None, cache_dir=calib_dir):
+        self.homography = homography
+        input_size = (cfg.input_width, cfg.input_height)
+        if homography is not None:
+            self.output_size = (cfg.output_width, cfg.output_height)
+        else:
+            self.output_size = input_size
+
+        key = hashlib.sha1()
+        for array in [cfg.calib_K, cfg.calib_D, homography]:
+            if array is not None:
+                key.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        key.update(np.array(input_size + self.output_size).tobytes())
+        self.filename = f"{cache_dir}/remap_{key.hexdigest()[:16]}.npz"
+
+        if os.path.exists(self.filename):
+            cached = np.load(self.filename)
+            self.map1, self.map2 = cached["map1"], cached["map2"]
+        else:
+            self.map1, self.map2 = self._build_maps(cfg, input_size)
+            try:
+                np.savez(self.filename, map1=self.map1, map2=self.map2)
+            except OSError:
+                print(f"Problem writing to {self.filename}")
+
+    def _build_maps(self, cfg, input_size):
+        newcameramtx, roi = cv2.getOptimalNewCameraMatrix(cfg.calib_K, cfg.calib_D, input_size, 1, input_size)
+
+        # cv2.initUndistortRectifyMap maps each output pixel p back through
+        # inv(newCameraMatrix @ R).  Undistorting to newcameramtx and then
+        # warping by H is the same as using H @ newcameramtx as the new camera
+        # matrix.
+        if self.homography is not None:
+            newcameramtx = self.homography @ newcameramtx
+
+        return cv2.initUndistortRectifyMap(cfg.calib_K, cfg.calib_D, np.eye(3), newcameramtx,
+                                           self.output_size, cv2.CV_16SC2)
+
+    def apply(self, image):
+        '''Undistort and warp an image with any number of channels.'''
+        return cv2.remap(image, self.map1, self.map2, cv2.INTER_LINEAR)
+
 def interpolate_missing_values(image, image_with_zeros_for_missing):
     # https://stackoverflow.com/questions/37662180/interpolate-missing-values-2d-python/39596856#39596856
     mask = image_with_zeros_for_missing == 0
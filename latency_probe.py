@@ -0,0 +1,69 @@
+'''
+Measures the glass-to-glass latency of the display and camera: the time from
+flipping a frame to the screen until a camera frame showing it is captured.
+A marker (an AprilTag with an id no robot uses) is flashed on screen and we
+time how long it takes to show up in detection, repeating a few times and
+keeping the median.
+'''
+
+import time
+import numpy as np
+
+LATENCY_MARKER_ID = 0
+
+class LatencyProbe:
+    def __init__(self, n_samples=10, timeout=2.0):
+        self.n_samples = n_samples
+
+        # Give up on a flash that hasn't been seen after this many seconds.
+        self.timeout = timeout
+
+        self.state = "idle"
+        self.samples = []
+        self.n_flashes = 0
+        self.shown_time = None
+
+        # The measured latency in seconds, once available.
+        self.latency = None
+
+    def start(self):
+        self.state = "show"
+        self.samples = []
+        self.n_flashes = 1
+        self.shown_time = None
+
+    def is_running(self):
+        return self.state != "idle"
+
+    def marker_visible(self):
+        '''Whether the game screen should draw the marker this frame.'''
+        return self.state == "show"
+
+    def frame_drawn(self, flip_time):
+        '''Called with the time of each flip of the game screen.'''
+        if self.state == "show" and self.shown_time is None:
+            self.shown_time = flip_time
+
+    def frame_detected(self, tag_frame, capture_time):
+        '''Called with the tags detected in each new camera frame (before any
+        filtering) and the time it was captured.'''
+        if self.state == "show" and self.shown_time is not None:
+            if LATENCY_MARKER_ID in tag_frame and capture_time > self.shown_time:
+                self.samples.append(capture_time - self.shown_time)
+                self.state = "hide"
+            elif time.monotonic() - self.shown_time > self.timeout:
+                print("Latency marker not detected.")
+                self.state = "hide"
+        elif self.state == "hide" and LATENCY_MARKER_ID not in tag_frame:
+            # The marker has gone.  Flash it again, or finish up.
+            if len(self.samples) >= self.n_samples or self.n_flashes >= 2 * self.n_samples:
+                if self.samples:
+                    self.latency = float(np.median(self.samples))
+                    print(f"glass-to-glass latency: {1000 * self.latency:.1f} ms")
+                else:
+                    print("Latency probe failed.")
+                self.state = "idle"
+            else:
+                self.state = "show"
+                self.n_flashes += 1
+                self.shown_time = None
@@ -5,6 +5,7 @@ level.  A goal can be augmented with game_appearance and game_action, which are
 labels that affect how the robot is displayed and 
 '''
 
+import time
 from abc import ABC, abstractmethod
 from random import random
 from math import atan2, cos, hypot, pi, sin
@@ -12,10 +13,25 @@ from math import atan2, cos, hypot, pi, sin
 from utils.angles import get_smallest_angular_difference
 from utils.vector2d import Vector2D
 from wow_tag import WowTag
+from collision import get_bullet_hits
+from sprite_pool import SpritePool, TIME_EPSILON
 import pygame
 
 PLAYER_TAG_ID = 1
-BULLET_TIME_TO_LIVE = 15
+
+# The game levels advance in fixed ticks of 1/TICK_RATE seconds, however fast
+# the main loop happens to run (see FixedTimestep).  The speeds and durations
+# below are per second, so the tick rate can be changed without affecting the
+# game's balance.  They match what were per-tick values at 30 ticks/s (see
+# TIME_EPSILON for how they are counted down).
+TICK_RATE = 30
+BULLET_SPEED = 600
+BULLET_TIME_TO_LIVE = 0.5
+PLAYER_FIRE_INTERVAL = 7 / 30
+ENEMY_FIRE_INTERVAL = 25 / 30
+
+# A bullet hits a robot if it passes within this distance of the tag's centre.
+HIT_RADIUS = 50
 
 #Versus Level Parameters:
 PLAYER_1_TAG_ID = 1
@@ -34,7 +50,7 @@ class AbstractLevel(ABC):
     
     # Updates the level and returns a dictionary of journey objects which
     # specify each robot's "intentions".  This dictionary is keyed by WowTag
-    # id's (which in turn come from AprilTag id's).
+    # id's (which in turn come from AprilTag id's).  wow_tags is a TagFrame.
     @abstractmethod
     def get_journey_dict(self, manual_movement, wow_tags):
         pass
@@ -45,6 +61,36 @@ class AbstractLevel(ABC):
     def get_sprites(self):
         return []
 
+class FixedTimestep:
+    '''Turns the time elapsed between calls to advance() into a whole number of
+    ticks, carrying the remainder over to the next call.'''
+    def __init__(self, tick_rate=TICK_RATE, max_ticks=5):
+        self.dt = 1 / tick_rate
+
+        # After a stall we simulate at most this many ticks, rather than
+        # trying to catch up all at once.
+        self.max_ticks = max_ticks
+
+        self.accumulator = 0
+        self.last_time = None
+
+        # How far (as a fraction of a tick) the current time is past the last
+        # tick.  Moving sprites are drawn this much further along.
+        self.alpha = 0
+
+    def advance(self, now=None):
+        '''Return the number of ticks due since the last call.'''
+        if now is None:
+            now = time.monotonic()
+        if self.last_time is not None:
+            self.accumulator += now - self.last_time
+        self.last_time = now
+
+        n_ticks = int(self.accumulator / self.dt)
+        self.accumulator -= n_ticks * self.dt
+        self.alpha = self.accumulator / self.dt
+        return min(n_ticks, self.max_ticks)
+
 class Journey:
     def __init__(self, start_x, start_y, start_angle, goal_x, goal_y):
         self.start_x = start_x
@@ -65,16 +111,39 @@ class Sprite:
         self.shooter_id = shooter_id
         self.font_size = font_size
 
+        # Where the sprite is drawn, which for a moving sprite may be a little
+        # ahead of centre_vec (see set_draw_time).
+        self.draw_centre_vec = centre_vec
+
+        # Where the sprite was before its last update, so collisions can be
+        # checked along the path it took.
+        self.previous_centre_vec = centre_vec
+
         self.terminate = False
-    def update(self):
-        '''Updates the sprite's position.'''
-        self.centre_vec = self.centre_vec + self.velocity_vec
+    def update(self, dt):
+        '''Updates the sprite's position dt seconds on.'''
+        self.previous_centre_vec = self.centre_vec
+        self.centre_vec = self.centre_vec + self.velocity_vec * dt
+        self.draw_centre_vec = self.centre_vec
         if not self.time_to_live is None:
-            if self.time_to_live > 0:
-                self.time_to_live -= 1
+            if self.time_to_live > TIME_EPSILON:
+                self.time_to_live -= dt
             else:
                 self.terminate = True
 
+    def set_draw_time(self, t):
+        '''Draw the sprite where it will be t seconds after its last update.'''
+        self.draw_centre_vec = self.centre_vec + self.velocity_vec * t
+
+    # Where the sprite is drawn as plain floats, as SpriteView gives them.
+    @property
+    def draw_x(self):
+        return self.draw_centre_vec.x
+
+    @property
+    def draw_y(self):
+        return self.draw_centre_vec.y
+
 def get_player_movement_goal(manual_movement, wow_tag):
     if manual_movement == "forward":
         delta_angle = 0
@@ -205,10 +274,15 @@ class FirstGameLevel(AbstractLevel):
         self.fire_timeout_dict = {}
         self.graveyard_list = []
 
-        self.player_bullet_sprites = []
-        self.enemy_bullet_sprites = []
+        # Bullets and explosions live in sprite pools.  Other decorations
+        # (i.e. text) are Sprites in deco_sprites.
+        self.player_bullet_sprites = SpritePool()
+        self.enemy_bullet_sprites = SpritePool()
+        self.explosion_sprites = SpritePool()
         self.deco_sprites = []
 
+        self.timestep = FixedTimestep()
+
     def _set_enemy_goal(self, wow_tag, wow_tags):
         '''An enemy will alternate between goals in the middle third of the
         environment and goals in the right third.'''
@@ -275,13 +349,13 @@ class FirstGameLevel(AbstractLevel):
                 if manual_movement == "fire":
                     if not wow_tag.id in self.fire_timeout_dict:
                         self.fire_timeout_dict[wow_tag.id] = 0
-                    elif self.fire_timeout_dict[wow_tag.id] > 0:
+                    elif self.fire_timeout_dict[wow_tag.id] > TIME_EPSILON:
                         continue
 
-                    vx = 20 * cos(wow_tag.angle)
-                    vy = 20 * sin(wow_tag.angle)
-                    self.player_bullet_sprites.append(Sprite(Vector2D(wow_tag.x, wow_tag.y), Vector2D(vx, vy), 5, 10, "blue", time_to_live=BULLET_TIME_TO_LIVE, flicker=True))
-                    self.fire_timeout_dict[wow_tag.id] = 7
+                    vx = BULLET_SPEED * cos(wow_tag.angle)
+                    vy = BULLET_SPEED * sin(wow_tag.angle)
+                    self.player_bullet_sprites.add(wow_tag.x, wow_tag.y, vx, vy, 5, 10, "blue", time_to_live=BULLET_TIME_TO_LIVE, flicker=True)
+                    self.fire_timeout_dict[wow_tag.id] = PLAYER_FIRE_INTERVAL
                     shoot.play()
 
                 continue
@@ -298,11 +372,16 @@ class FirstGameLevel(AbstractLevel):
                 if hypot(journey.goal_x - x, journey.goal_y - y) < 50:
                     self._set_enemy_goal(wow_tag, wow_tags)
 
-        self._update_sprites(wow_tags)
+        dt = self.timestep.dt
+        for _ in range(self.timestep.advance()):
+            self._update_sprites(dt, wow_tags)
 
-        for id in self.fire_timeout_dict:
-            if self.fire_timeout_dict[id] > 0:
-                self.fire_timeout_dict[id] -= 1
+            for id in self.fire_timeout_dict:
+                if self.fire_timeout_dict[id] > TIME_EPSILON:
+                    self.fire_timeout_dict[id] -= dt
+
+        self.player_bullet_sprites.set_draw_time(self.timestep.alpha * dt)
+        self.enemy_bullet_sprites.set_draw_time(self.timestep.alpha * dt)
 
         return self.journey_dict
 
@@ -317,8 +396,8 @@ class FirstGameLevel(AbstractLevel):
             goal_sprites.append(goal_id_sprite)
 
         # Uncomment to display goal_sprites.
-        # return goal_sprites + self.player_bullet_sprites + self.enemy_bullet_sprites + self.deco_sprites
-        return self.player_bullet_sprites + self.enemy_bullet_sprites + self.deco_sprites
+        # return goal_sprites + list(self.player_bullet_sprites) + list(self.enemy_bullet_sprites) + list(self.explosion_sprites) + self.deco_sprites
+        return list(self.player_bullet_sprites) + list(self.enemy_bullet_sprites) + list(self.explosion_sprites) + self.deco_sprites
 
     def _enemies_firing_at_player(self, player_tag, wow_tags):
         '''The enemies will fire at the player if angled to potentially hit it.'''
@@ -336,77 +415,65 @@ class FirstGameLevel(AbstractLevel):
             if angle_to_player < pi/8:
                 if not wow_tag.id in self.fire_timeout_dict:
                     self.fire_timeout_dict[wow_tag.id] = 0
-                elif self.fire_timeout_dict[wow_tag.id] > 0:
+                elif self.fire_timeout_dict[wow_tag.id] > TIME_EPSILON:
                     continue
 
-                vx = 20 * cos(wow_tag.angle)
-                vy = 20 * sin(wow_tag.angle)
-                self.enemy_bullet_sprites.append(Sprite(Vector2D(wow_tag.x, wow_tag.y), Vector2D(vx, vy), 5, 10, "red", time_to_live=BULLET_TIME_TO_LIVE, flicker=True))
-                self.fire_timeout_dict[wow_tag.id] = 25
+                vx = BULLET_SPEED * cos(wow_tag.angle)
+                vy = BULLET_SPEED * sin(wow_tag.angle)
+                self.enemy_bullet_sprites.add(wow_tag.x, wow_tag.y, vx, vy, 5, 10, "red", time_to_live=BULLET_TIME_TO_LIVE, flicker=True)
+                self.fire_timeout_dict[wow_tag.id] = ENEMY_FIRE_INTERVAL
                 shoot.play()
 
     def _check_bullet_enemy_collisions(self, wow_tags):
         '''Check for collision between the player's bullet sprites and enemy tags.'''
 
-        for b in self.player_bullet_sprites:
-            for wow_tag in wow_tags:
-                if wow_tag.id == PLAYER_TAG_ID:
-                    continue
-                tag_pos = Vector2D(wow_tag.x, wow_tag.y)
-                if Vector2D.Distance(tag_pos, b.centre_vec) < 50:
-                    b.terminate = True
-                    if not wow_tag.id in self.graveyard_list:
-                        self.graveyard_list.append(wow_tag.id)
-                        self.journey_dict.pop(wow_tag.id)
-                        self.deco_sprites.append(Sprite(Vector2D(wow_tag.x, wow_tag.y), Vector2D(0, 0), 50, 100, "red", flicker=True))
-                        hit.play()
+        enemy_tags = [wow_tag for wow_tag in wow_tags if wow_tag.id != PLAYER_TAG_ID]
+        for i, wow_tag in get_bullet_hits(self.player_bullet_sprites, enemy_tags, HIT_RADIUS):
+            self.player_bullet_sprites.terminate[i] = True
+            if not wow_tag.id in self.graveyard_list:
+                self.graveyard_list.append(wow_tag.id)
+                self.journey_dict.pop(wow_tag.id)
+                self.explosion_sprites.add(wow_tag.x, wow_tag.y, 0, 0, 50, 100, "red", flicker=True)
+                hit.play()
 
     def _check_bullet_player_collisions(self, player_tag, wow_tags):
         '''Check for collision between the enemies' bullet sprites and the player.'''
         if player_tag is None:
             return
-        for b in self.enemy_bullet_sprites:
-            player_pos = Vector2D(player_tag.x, player_tag.y)
-            if Vector2D.Distance(player_pos, b.centre_vec) < 50:
-                b.terminate = True
-                if player_tag.id not in self.graveyard_list:# Could just say 0, but maybe this will change.
-                    self.graveyard_list.append(player_tag.id) 
-                    self.deco_sprites.append(Sprite(Vector2D(player_tag.x, player_tag.y), Vector2D(0, 0), 50, 100, "red", flicker=True))
-                    hit.play()
-                    self.game_over = True
+        for i, _ in get_bullet_hits(self.enemy_bullet_sprites, [player_tag], HIT_RADIUS):
+            self.enemy_bullet_sprites.terminate[i] = True
+            if player_tag.id not in self.graveyard_list:# Could just say 0, but maybe this will change.
+                self.graveyard_list.append(player_tag.id) 
+                self.explosion_sprites.add(player_tag.x, player_tag.y, 0, 0, 50, 100, "red", flicker=True)
+                hit.play()
+                self.game_over = True
 
     def _check_bullet_player_collisions(self, player_tag, wow_tags):
         if player_tag is None:
             return
-        for b in self.enemy_bullet_sprites:
-            player_pos = Vector2D(player_tag.x, player_tag.y)
-            if Vector2D.Distance(player_pos, b.centre_vec) < 50:
-                b.terminate = True
-                if player_tag.id not in self.graveyard_list:
-                    self.graveyard_list.append(player_tag.id) 
-                    self.deco_sprites.append(Sprite(Vector2D(player_tag.x, player_tag.y), Vector2D(0, 0), 50, 100, "red", flicker=True))
-                    game_over_sprite = Sprite(Vector2D(self.width/2, self.height/2), Vector2D(0, 0), 0, 0, "white", font_size=90)
-                    game_over_sprite.text = "Game Over!"
-                    self.deco_sprites.append(game_over_sprite)
-                    game_over.play()
-                    self.game_over = True  
-
-
-    def _update_sprites(self, wow_tags):
-        for sprite in self.player_bullet_sprites + self.enemy_bullet_sprites:
-            sprite.update()
-
-        player_tag = None
-        for wow_tag in wow_tags:
-            if wow_tag.id == PLAYER_TAG_ID:
-                player_tag = wow_tag
-                break
+        for i, _ in get_bullet_hits(self.enemy_bullet_sprites, [player_tag], HIT_RADIUS):
+            self.enemy_bullet_sprites.terminate[i] = True
+            if player_tag.id not in self.graveyard_list:
+                self.graveyard_list.append(player_tag.id) 
+                self.explosion_sprites.add(player_tag.x, player_tag.y, 0, 0, 50, 100, "red", flicker=True)
+                game_over_sprite = Sprite(Vector2D(self.width/2, self.height/2), Vector2D(0, 0), 0, 0, "white", font_size=90)
+                game_over_sprite.text = "Game Over!"
+                self.deco_sprites.append(game_over_sprite)
+                game_over.play()
+                self.game_over = True  
+
+
+    def _update_sprites(self, dt, wow_tags):
+        self.player_bullet_sprites.update(dt)
+        self.enemy_bullet_sprites.update(dt)
+
+        player_tag = wow_tags.get(PLAYER_TAG_ID)
         self._enemies_firing_at_player(player_tag, wow_tags)
         self._check_bullet_enemy_collisions(wow_tags)
         self._check_bullet_player_collisions(player_tag, wow_tags)
 
-        self.player_bullet_sprites = [b for b in self.player_bullet_sprites if not b.terminate]
-        self.enemy_bullet_sprites = [b for b in self.enemy_bullet_sprites if not b.terminate]
+        self.player_bullet_sprites.remove_terminated()
+        self.enemy_bullet_sprites.remove_terminated()
 
         all_enemy_ids = [id for id in self.journey_dict if id != PLAYER_TAG_ID]
 
@@ -429,12 +496,19 @@ class VersusGameLevel(AbstractLevel):
         self.graveyard_list = []
         self.shields = {PLAYER_1_TAG_ID: 2, PLAYER_2_TAG_ID: 2}
 
-        self.bullet_sprites = []
+        # As in FirstGameLevel, bullets and explosions are pooled.
+        self.bullet_sprites = SpritePool()
+        self.explosion_sprites = SpritePool()
         self.deco_sprites = []
 
+        self.timestep = FixedTimestep()
+
     def get_journey_dict(self, manual_movement, wow_tags):
         if self.game_over:
             return self.journey_dict
+
+        # A player detected twice this frame only moves, fires and is hit once.
+        wow_tags = wow_tags.unique()
         for tag in wow_tags:
             if tag.id in self.graveyard_list:
                 continue
@@ -445,10 +519,14 @@ class VersusGameLevel(AbstractLevel):
             elif tag.id == PLAYER_2_TAG_ID:
                 self._handle_movement_and_shooting(tag, manual_movement.get("p2", ""), "red")
 
-        self._update_sprites(wow_tags)
-        for id in self.fire_timeout_dict:
-            if self.fire_timeout_dict[id] > 0:
-                self.fire_timeout_dict[id] -= 1
+        dt = self.timestep.dt
+        for _ in range(self.timestep.advance()):
+            self._update_sprites(dt, wow_tags)
+            for id in self.fire_timeout_dict:
+                if self.fire_timeout_dict[id] > TIME_EPSILON:
+                    self.fire_timeout_dict[id] -= dt
+
+        self.bullet_sprites.set_draw_time(self.timestep.alpha * dt)
 
         return self.journey_dict
 
@@ -460,49 +538,46 @@ class VersusGameLevel(AbstractLevel):
             self.journey_dict.pop(tag.id)
 
         if move_cmd == "fire":
-            if self.fire_timeout_dict.get(tag.id, 0) <= 0:
-                vx = 20 * cos(tag.angle)
-                vy = 20 * sin(tag.angle)
-                self.bullet_sprites.append(Sprite(Vector2D(tag.x, tag.y), Vector2D(vx, vy), 5, 10, bullet_color, time_to_live=BULLET_TIME_TO_LIVE, flicker=True, shooter_id=tag.id))
-                self.fire_timeout_dict[tag.id] = 7
+            if self.fire_timeout_dict.get(tag.id, 0) <= TIME_EPSILON:
+                vx = BULLET_SPEED * cos(tag.angle)
+                vy = BULLET_SPEED * sin(tag.angle)
+                self.bullet_sprites.add(tag.x, tag.y, vx, vy, 5, 10, bullet_color, time_to_live=BULLET_TIME_TO_LIVE, flicker=True, shooter_id=tag.id)
+                self.fire_timeout_dict[tag.id] = PLAYER_FIRE_INTERVAL
                 shoot.play()
 
-    def _update_sprites(self, wow_tags):
-        for sprite in self.bullet_sprites:
-            sprite.update()
-
-        id_to_tag = {tag.id: tag for tag in wow_tags}
+    def _update_sprites(self, dt, wow_tags):
+        self.bullet_sprites.update(dt)
 
-        for b in self.bullet_sprites:
-            for player_id, tag in id_to_tag.items():
-                if player_id in self.graveyard_list:
-                    continue
-                if b.shooter_id == player_id:
-                    continue
-                if Vector2D.Distance(Vector2D(tag.x, tag.y), b.centre_vec) < 50:
-                    b.terminate = True           
-                    # Check shields
-                    if self.shields.get(player_id, 0) > 0:
-                        self.shields[player_id] -= 1
-                        hit.play()
-                    else:
-                        self.graveyard_list.append(player_id)
-                        self.journey_dict.pop(player_id, None)
-                        self.deco_sprites.append(Sprite(Vector2D(tag.x, tag.y), Vector2D(0, 0), 50, 100, "red", flicker=True))
-                        hit.play()
-                        win.play()
-                        if getattr(b, "shooter_id", None) == PLAYER_2_TAG_ID:
-                            win_pos = Vector2D(self.width - 60, self.height / 2)  # right side
-                            angle = 90
-                        elif getattr(b, "shooter_id", None) == PLAYER_1_TAG_ID:
-                            win_pos = Vector2D(60, self.height / 2)  # left side
-                            angle = -90
+        for i, tag in get_bullet_hits(self.bullet_sprites, wow_tags, HIT_RADIUS):
+            player_id = tag.id
+            shooter_id = self.bullet_sprites.shooter_id[i]
+            if player_id in self.graveyard_list:
+                continue
+            if shooter_id == player_id:
+                continue
+            self.bullet_sprites.terminate[i] = True           
+            # Check shields
+            if self.shields.get(player_id, 0) > 0:
+                self.shields[player_id] -= 1
+                hit.play()
+            else:
+                self.graveyard_list.append(player_id)
+                self.journey_dict.pop(player_id, None)
+                self.explosion_sprites.add(tag.x, tag.y, 0, 0, 50, 100, "red", flicker=True)
+                hit.play()
+                win.play()
+                if shooter_id == PLAYER_2_TAG_ID:
+                    win_pos = Vector2D(self.width - 60, self.height / 2)  # right side
+                    angle = 90
+                elif shooter_id == PLAYER_1_TAG_ID:
+                    win_pos = Vector2D(60, self.height / 2)  # left side
+                    angle = -90
                         
-                        self.deco_sprites.append(RotatedTextSprite("You Win!", win_pos, "white", font_size=90, angle=angle))
-                        self.game_over = True
+                self.deco_sprites.append(RotatedTextSprite("You Win!", win_pos, "white", font_size=90, angle=angle))
+                self.game_over = True
                         
 
-        self.bullet_sprites = [b for b in self.bullet_sprites if not b.terminate]
+        self.bullet_sprites.remove_terminated()
 
     def get_sprites(self):
-        return self.bullet_sprites + self.deco_sprites
\ No newline at end of file
+        return list(self.bullet_sprites) + list(self.explosion_sprites) + self.deco_sprites
\ No newline at end of file
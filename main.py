@@ -7,15 +7,22 @@ from math import atan2, cos, pi, sin
 # This is a rather unneccessary dependency, but I like pygame's vector class.
 from pygame.math import Vector2
 
-from wow_tag import WowTag, raw_tags_to_wow_tags, apply_tg_calibration_to_raw_tags
+from wow_tag import WowTag, TagFrame, raw_tags_to_tag_arrays, apply_tg_calibration_to_tag_arrays
 from config_loader import ConfigLoader
 from game_screen import GameScreen
-from image_processing import capture_and_preprocess
+from image_processing import capture_timestamped, grab_timestamped, retrieve, preprocess, FusedRemap
+from pipeline import CapturePipeline
+from tracked_detector import TrackedDetector, get_window_radius
+from detector_scheduler import DetectorScheduler
+from tiled_detector import TiledDetector
+from tag_filter import TagPoseFilter
+from latency_probe import LatencyProbe, LATENCY_MARKER_ID
+from frame_scheduler import FrameScheduler
 from config_loader import venue
 
 # Customize the level and controller.
 from levels import DummyLevel, SynchronyLevel, TestLevel, FirstGameLevel, VersusGameLevel
-from generators import CurveArcGenerator
+from generators import CachedController, CurveArcGenerator
 #from generators import GuidanceImageGenerator
 from controllers import SmoothController1
 #from controllers import DubinsController
@@ -27,7 +34,8 @@ if __name__ == "__main__":
 
     cfg = ConfigLoader.get()
 
-    game_screen = GameScreen(cfg.output_width, cfg.output_height, cfg.fullscreen)
+    game_screen = GameScreen(cfg.output_width, cfg.output_height, cfg.fullscreen, incremental=cfg.incremental_rendering,
+                             vsync=cfg.vsync)
 
     #guidance_image_generator = GuidanceImageGenerator(cfg.output_width, cfg.output_height, DubinsLightController())
 
@@ -52,6 +60,26 @@ if __name__ == "__main__":
         output_corners = [[0, 0], [cfg.output_width-1, 0], [cfg.output_width-1, cfg.output_height-1], [0, cfg.output_height-1]]
         homography, status = cv2.findHomography(np.array(cfg.screen_corners), np.array(output_corners))
 
+    # The windows searched around tracked tags are sized to the tags as they
+    # appear in the detected image.
+    window_radius = get_window_radius(cfg, warped=homography is not None)
+
+    # Optionally let the detector settings adapt to a target frame time,
+    # search only around where the tags are predicted to be, or split the
+    # frame into tiles searched by a process pool.  These are alternatives.
+    tag_detector = apriltag_detector
+    if cfg.adaptive_detection:
+        tag_detector = DetectorScheduler(window_radius=window_radius)
+    elif cfg.tracked_detection:
+        tag_detector = TrackedDetector(apriltag_detector, window_radius=window_radius)
+    elif cfg.tiled_detection:
+        tag_detector = TiledDetector(cfg.tg_tag_size)
+
+    # Undistortion and warping fused into one precomputed lookup.
+    remap = None
+    if cfg.use_remap_tables:
+        remap = FusedRemap(cfg, homography=homography)
+
     if cfg.use_tg_calibration:
         directory = f"tg_calib_{venue}/delta_{cfg.tg_delta}"
 
@@ -68,75 +96,184 @@ if __name__ == "__main__":
     cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)  # Turn off autofocus
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, cfg.input_width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cfg.input_height)
+    if cfg.read_luma:
+        # Take frames as the backend delivers them (YUYV or MJPEG) so that
+        # preprocessing can pull out the luma plane without a colour
+        # conversion.
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
 
-    while True:
-
-        start_time = time.time()
-
-        gray_image, warped_image = capture_and_preprocess(cap, cfg, homography=homography)
+    # With gray_first, the colour image is only produced while a screenshot
+    # is pending.  The screenshot is then taken when that frame is drawn.
+    def preprocess_frame(image):
+        return preprocess(image, cfg, homography=homography, remap=remap,
+                          gray_first=cfg.gray_first, want_colour=game_screen.screenshot_pending)
 
-        raw_tags = apriltag_detector.detect(gray_image)
+    def detect_wow_tags(gray_image):
+        raw_tags = tag_detector.detect(gray_image)
 
         if cfg.use_tg_calibration:
-            raw_tags = apply_tg_calibration_to_raw_tags(raw_tags, tg_calib_count, tg_calib_x, tg_calib_y)
-
-        wow_tags = raw_tags_to_wow_tags(raw_tags)
-
-        game_screen.handle_events()
-
-        if game_screen.get_restart():
-            if isinstance(level, FirstGameLevel):
-                level = FirstGameLevel(cfg.output_width, cfg.output_height)
-            elif isinstance(level, VersusGameLevel):
-                level = VersusGameLevel(cfg.output_width, cfg.output_height)
-            game_screen.restart = False
-
-        do_screenshot, screenshot_index = game_screen.get_do_screenshot()
-
-        if isinstance(level, VersusGameLevel):
-            manual_movement = {
-                "p1": game_screen.get_movement_for_player1(),
-                "p2": game_screen.get_movement_for_player2()
-            }
-        else:
-            manual_movement = game_screen.get_movement_for_player1()
-
-
-        # The level is responsibility for determine the application's evolution.
-        # This is communicated in a dictionary of journeys for tags (i.e. robots)
-        # and a list of sprites which are graphical elements.
-        journey_dict = level.get_journey_dict(manual_movement, wow_tags)
-
-        sprites = level.get_sprites()
-
-        arcs, curves = curve_arc_generator.generate(wow_tags, journey_dict)
-        #curve_image = guidance_image_generator.generate(wow_tags, journey_dict)
-        #cv2.imshow("curve_image", curve_image)
-        #cv2.waitKey(1)
-
-        game_screen.update(wow_tags, arcs, curves, sprites, game_over=getattr(level, "game_over", False), level=level)
-        #game_screen.update(wow_tags, [], [], sprites, background_image=curve_image)
-
-        if do_screenshot:
-            #filename_raw = f"screenshots/raw_{screenshot_index:02}.png"
-            filename_warped = f"screenshots/warped_{screenshot_index:02}.png"
-            try:
-                #cv2.imwrite(filename_raw, raw_image)
-                cv2.imwrite(filename_warped, warped_image)
-            except:
-                #print(f"Problem writing to {filename_raw} or {filename_warped}")
-                print(f"Problem writing to {filename_warped}")
-
-        if cfg.show_input:
-            resize_divisor = 1
-            if resize_divisor > 1:
-                cv2.resizeWindow(input_window_name, gray_image.shape[1]//resize_divisor, gray_image.shape[0]//resize_divisor)
-            cv2.imshow(input_window_name, gray_image)
-            cv2.waitKey(10)
-
-        elapsed = time.time() - start_time
-        print(f"loop elapsed time: {elapsed}")
-
-        #time.sleep(0.1)
-
-    cap.release()
\ No newline at end of file
+            ids, points = raw_tags_to_tag_arrays(raw_tags)
+            ids, points = apply_tg_calibration_to_tag_arrays(ids, points, tg_calib_count, tg_calib_x, tg_calib_y)
+            return TagFrame.from_tag_arrays(ids, points)
+
+        return TagFrame.from_raw_tags(raw_tags)
+
+    # Optionally memoize the controller's curves.  A cached curve is for a goal
+    # snapped to CachedController's position_quantum, so it can differ
+    # slightly from the controller's own.
+    if cfg.cache_curves:
+        curve_arc_generator.controller = CachedController(curve_arc_generator.controller)
+
+    # Smooths tag poses over time.  The curve generator also uses it to
+    # project poses forwards by the glass-to-glass latency, which is
+    # prediction_horizon until the latency probe (started with 'l') measures
+    # it.
+    pose_filter = None
+    if cfg.pose_filter:
+        pose_filter = TagPoseFilter()
+        curve_arc_generator.set_projection(pose_filter, cfg.prediction_horizon)
+    latency_probe = LatencyProbe()
+
+    # Frames are drawn at cfg.display_rate, and detection is limited to
+    # cfg.detection_rate (between detections the last tags are reused).  The
+    # level's ticks are driven separately by its FixedTimestep, off the wall
+    # clock, so the game runs at the same speed whatever the frame rate or
+    # detection throughput.
+    frame_scheduler = FrameScheduler(cfg.display_rate, cfg.detection_rate)
+
+    def throttled_detect_wow_tags(gray_image):
+        frame_scheduler.wait_for_detection()
+        return detect_wow_tags(gray_image)
+
+    # In pipelined mode, grabbing, preprocessing and detection run on their own
+    # threads and this loop just renders the freshest detected frame.
+    pipeline = None
+    if cfg.pipelined:
+        pipeline = CapturePipeline(lambda: capture_timestamped(cap, cfg), preprocess_frame, throttled_detect_wow_tags)
+        pipeline.start()
+
+    # The loop ends once the game screen is asked to terminate.  The screen,
+    # threads, worker processes and camera are released however it ends.
+    try:
+        while not game_screen.terminate:
+
+            if pipeline is not None:
+                # Don't hold up drawing waiting for a new frame, unless we're not
+                # pacing the loop.
+                frame = pipeline.get_latest(timeout=0 if cfg.display_rate > 0 else 0.1)
+                if frame is None:
+                    game_screen.handle_events()
+                    frame_scheduler.wait()
+                    continue
+                gray_image, warped_image, wow_tags = frame.gray_image, frame.warped_image, frame.wow_tags
+                capture_time = frame.capture_time
+                is_new_frame = not frame.rendered
+            else:
+                # Every frame is grabbed, so that the camera's buffer never
+                # holds stale ones, but only decoded when detection is due.
+                grab_time = grab_timestamped(cap)
+                if grab_time is None:
+                    game_screen.handle_events()
+                    frame_scheduler.wait()
+                    continue
+
+                is_new_frame = frame_scheduler.detection_due()
+                if is_new_frame:
+                    image = retrieve(cap)
+                    if image is None:
+                        game_screen.handle_events()
+                        frame_scheduler.wait()
+                        continue
+                    capture_time = grab_time
+                    gray_image, warped_image = preprocess_frame(image)
+
+                    wow_tags = detect_wow_tags(gray_image)
+                    frame_scheduler.detection_done()
+
+            if latency_probe.is_running():
+                if is_new_frame:
+                    latency_probe.frame_detected(wow_tags, capture_time)
+                wow_tags = wow_tags.without(LATENCY_MARKER_ID)
+            if latency_probe.latency is not None and pose_filter is not None:
+                curve_arc_generator.set_projection(pose_filter, latency_probe.latency)
+
+            if pose_filter is not None:
+                if is_new_frame:
+                    pose_filter.update(wow_tags, capture_time)
+                wow_tags = pose_filter.predict(capture_time)
+
+            game_screen.handle_events()
+
+            if game_screen.get_start_latency_probe():
+                latency_probe.start()
+
+            if game_screen.get_restart():
+                if isinstance(level, FirstGameLevel):
+                    level = FirstGameLevel(cfg.output_width, cfg.output_height)
+                elif isinstance(level, VersusGameLevel):
+                    level = VersusGameLevel(cfg.output_width, cfg.output_height)
+                game_screen.restart = False
+
+            # Take a pending screenshot on the first new frame with a colour image
+            # (without a homography there never is one).
+            if game_screen.screenshot_pending and is_new_frame and (warped_image is not None or homography is None):
+                game_screen.screenshot_pending = False
+                game_screen.do_screenshot = True
+
+            do_screenshot, screenshot_index = game_screen.get_do_screenshot()
+
+            if isinstance(level, VersusGameLevel):
+                manual_movement = {
+                    "p1": game_screen.get_movement_for_player1(),
+                    "p2": game_screen.get_movement_for_player2()
+                }
+            else:
+                manual_movement = game_screen.get_movement_for_player1()
+
+
+            # The level is responsibility for determine the application's evolution.
+            # This is communicated in a dictionary of journeys for tags (i.e. robots)
+            # and a list of sprites which are graphical elements.
+            journey_dict = level.get_journey_dict(manual_movement, wow_tags)
+
+            sprites = level.get_sprites()
+
+            arcs, curves = curve_arc_generator.generate(wow_tags, journey_dict)
+            #curve_image = guidance_image_generator.generate(wow_tags, journey_dict)
+            #cv2.imshow("curve_image", curve_image)
+            #cv2.waitKey(1)
+
+            game_screen.update(wow_tags, arcs, curves, sprites, game_over=getattr(level, "game_over", False), level=level,
+                               show_latency_marker=latency_probe.marker_visible())
+            if latency_probe.is_running():
+                latency_probe.frame_drawn(game_screen.last_flip_time)
+            #game_screen.update(wow_tags, [], [], sprites, background_image=curve_image)
+
+            if do_screenshot and warped_image is not None:
+                #filename_raw = f"screenshots/raw_{screenshot_index:02}.png"
+                filename_warped = f"screenshots/warped_{screenshot_index:02}.png"
+                try:
+                    #cv2.imwrite(filename_raw, raw_image)
+                    cv2.imwrite(filename_warped, warped_image)
+                except:
+                    #print(f"Problem writing to {filename_raw} or {filename_warped}")
+                    print(f"Problem writing to {filename_warped}")
+
+            if cfg.show_input:
+                resize_divisor = 1
+                if resize_divisor > 1:
+                    cv2.resizeWindow(input_window_name, gray_image.shape[1]//resize_divisor, gray_image.shape[0]//resize_divisor)
+                cv2.imshow(input_window_name, gray_image)
+                cv2.waitKey(10)
+
+            if pipeline is not None:
+                pipeline.frame_rendered(frame)
+
+            frame_scheduler.wait()
+    finally:
+        if pipeline is not None:
+            pipeline.stop()
+        if isinstance(tag_detector, TiledDetector):
+            tag_detector.close()
+        cap.release()
+        game_screen.close()
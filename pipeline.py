@@ -0,0 +1,189 @@
+'''
+A pipelined alternative to running capture, preprocessing and detection one
+after the other in the main loop.  Each stage runs on its own thread and hands
+its output to the next through a slot holding at most one frame, where a new
+frame always replaces one that hasn't been taken yet (latest-frame-wins).
+Rendering stays on the main thread, since pygame requires it, and simply takes
+whichever frame is freshest.
+'''
+
+import threading, time
+
+# The stages a frame passes through, in order.  Each gets a timestamp when it
+# completes.
+STAGES = ["grab", "preprocess", "detect", "render"]
+
+class LatestSlot:
+    '''A bounded (size one) hand-off between two stages.'''
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.closed = False
+
+        # Number of items overwritten before anyone took them.
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.item is not None:
+                self.dropped += 1
+            self.item = item
+            self.condition.notify()
+
+    def take(self, timeout=None):
+        '''Wait for and remove the newest item.  Returns None on timeout or
+        once the slot is closed.'''
+        with self.condition:
+            if self.item is None and not self.closed:
+                self.condition.wait(timeout)
+            item = self.item
+            self.item = None
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class PipelineFrame:
+    '''One camera frame and everything derived from it on its way to the
+    screen.'''
+    def __init__(self, index):
+        self.index = index
+        self.start_time = time.monotonic()
+
+        # When the camera delivered this frame (see capture_timestamped).
+        self.capture_time = None
+
+        self.stamps = {}
+        self.rendered = False
+
+        self.image = None
+        self.gray_image = None
+        self.warped_image = None
+        self.wow_tags = None
+
+    def stamp(self, stage):
+        self.stamps[stage] = time.monotonic()
+
+    def stage_latencies(self):
+        '''Time spent in each stage, including time spent waiting for the
+        stage to pick the frame up.'''
+        latencies = {}
+        previous = self.start_time
+        for stage in STAGES:
+            if stage in self.stamps:
+                latencies[stage] = self.stamps[stage] - previous
+                previous = self.stamps[stage]
+        latencies["total"] = previous - self.start_time
+        return latencies
+
+class CapturePipeline:
+    '''Runs the grab, preprocess and detect stages on worker threads.  The
+    stage functions are supplied by the caller:
+
+        grab()                  -> (raw image, capture time), or (None, None) on failure
+        preprocess(image)       -> (gray_image, warped_image)
+        detect(gray_image)      -> wow_tags
+    '''
+    def __init__(self, grab, preprocess, detect, report_interval=100):
+        self.grab = grab
+        self.preprocess = preprocess
+        self.detect = detect
+        self.report_interval = report_interval
+
+        self.preprocess_slot = LatestSlot()
+        self.detect_slot = LatestSlot()
+        self.output_slot = LatestSlot()
+
+        self.running = False
+        self.threads = []
+        self.latest = None
+
+        self.latency_sums = {}
+        self.n_rendered = 0
+        self.n_dropped_reported = 0
+
+    def start(self):
+        self.running = True
+        for target in [self._grab_loop, self._preprocess_loop, self._detect_loop]:
+            # Daemon threads so that a blocking cap.read() can't keep the
+            # process alive after the game screen closes.
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        for slot in [self.preprocess_slot, self.detect_slot, self.output_slot]:
+            slot.close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.threads = []
+
+    def get_latest(self, timeout=0.1):
+        '''Return the freshest fully-detected frame, waiting up to timeout
+        seconds for a new one.  If none arrives the previous frame is returned
+        again (or None if there hasn't been one yet).'''
+        frame = self.output_slot.take(timeout)
+        if frame is not None:
+            self.latest = frame
+        return self.latest
+
+    def frame_rendered(self, frame):
+        '''Called by the render stage once frame has been drawn.  Accumulates
+        per-stage latencies and prints a summary every report_interval
+        frames.'''
+        if frame is None or frame.rendered:
+            return
+        frame.rendered = True
+        frame.stamp("render")
+
+        for stage, latency in frame.stage_latencies().items():
+            self.latency_sums[stage] = self.latency_sums.get(stage, 0) + latency
+        self.n_rendered += 1
+
+        if self.n_rendered == self.report_interval:
+            self.report()
+
+    def report(self):
+        if self.n_rendered == 0:
+            return
+        averages = ", ".join(f"{stage}: {1000 * total / self.n_rendered:.1f}"
+                             for stage, total in self.latency_sums.items())
+        n_dropped = self.preprocess_slot.dropped + self.detect_slot.dropped + self.output_slot.dropped
+        print(f"pipeline latency (ms) over {self.n_rendered} frames: {averages}; dropped frames: {n_dropped - self.n_dropped_reported}")
+        self.n_dropped_reported = n_dropped
+        self.latency_sums = {}
+        self.n_rendered = 0
+
+    def _grab_loop(self):
+        index = 0
+        while self.running:
+            frame = PipelineFrame(index)
+            frame.image, frame.capture_time = self.grab()
+            if frame.image is None:
+                time.sleep(0.01)
+                continue
+            frame.stamp("grab")
+            self.preprocess_slot.put(frame)
+            index += 1
+
+    def _preprocess_loop(self):
+        while self.running:
+            frame = self.preprocess_slot.take()
+            if frame is None:
+                continue
+            frame.gray_image, frame.warped_image = self.preprocess(frame.image)
+            frame.image = None
+            frame.stamp("preprocess")
+            self.detect_slot.put(frame)
+
+    def _detect_loop(self):
+        while self.running:
+            frame = self.detect_slot.take()
+            if frame is None:
+                continue
+            frame.wow_tags = self.detect(frame.gray_image)
+            frame.stamp("detect")
+            self.output_slot.put(frame)
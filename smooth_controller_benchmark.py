@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+'''
+Compares SmoothController1's adaptive-step curve generation with the original
+fixed-step loop over random journeys: wall time, number of points, and how far
+the adaptive curve strays from the fixed-step one.
+'''
+
+import sys, time
+import numpy as np
+from math import pi
+
+from levels import Journey
+from controllers import SmoothController1
+
+def max_deviation(points, reference_points):
+    '''Largest distance from any of points to the nearest of
+    reference_points.'''
+    points = np.array(points, dtype=float)
+    reference_points = np.array(reference_points, dtype=float)
+    deviation = 0
+    for chunk in np.array_split(points, max(len(points) // 100, 1)):
+        distances = np.hypot(chunk[:, np.newaxis, 0] - reference_points[:, 0], chunk[:, np.newaxis, 1] - reference_points[:, 1])
+        deviation = max(deviation, distances.min(axis=1).max())
+    return deviation
+
+if __name__ == "__main__":
+
+    n_journeys = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    rng = np.random.default_rng(0)
+    journeys = []
+    for _ in range(n_journeys):
+        start_x, start_y, goal_x, goal_y = rng.uniform(0, [1920, 1080, 1920, 1080])
+        journeys.append(Journey(start_x, start_y, rng.uniform(-pi, pi), goal_x, goal_y))
+
+    controller = SmoothController1()
+
+    start_time = time.perf_counter()
+    reference_curves = [controller.get_curve_points_fixed_step(journey) for journey in journeys]
+    fixed_step_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    curves = [controller.get_curve_points(journey) for journey in journeys]
+    adaptive_time = time.perf_counter() - start_time
+
+    deviations = [max_deviation(curve, reference) for curve, reference in zip(curves, reference_curves)]
+    end_errors = [np.hypot(curve[-1][0] - reference[-1][0], curve[-1][1] - reference[-1][1])
+                  for curve, reference in zip(curves, reference_curves)]
+
+    print(f"{n_journeys} journeys")
+    print(f"fixed step: {1000 * fixed_step_time / n_journeys:8.2f} ms/curve, {np.mean([len(c) for c in reference_curves]):8.0f} points/curve")
+    print(f"adaptive:   {1000 * adaptive_time / n_journeys:8.2f} ms/curve, {np.mean([len(c) for c in curves]):8.0f} points/curve")
+    print(f"deviation from fixed step: mean {np.mean(deviations):.2f} px, max {np.max(deviations):.2f} px")
+    print(f"end point error: mean {np.mean(end_errors):.2f} px, max {np.max(end_errors):.2f} px")
@@ -0,0 +1,198 @@
+'''
+A pool of simple moving sprites (bullets and explosions) kept as a struct of
+arrays.  Rather than each being a Sprite object doing its own Vector2D
+arithmetic, a sprite is a slot in a set of preallocated NumPy arrays.  Slots
+of terminated sprites are put on a free list for reuse, and all sprites are
+moved in a single vectorized step.  Iterating over a pool gives a SpriteView
+for each live sprite, which has the attributes GameScreen expects of a Sprite.
+'''
+
+import numpy as np
+from utils.vector2d import Vector2D
+
+# Times to live (and the levels' cooldowns) are counted down in seconds by a
+# tick's dt at a time, and rounding can leave them a hair above zero when they
+# should have run out.  Anything at or below this counts as zero, so that a
+# duration of n ticks lasts exactly n ticks.
+TIME_EPSILON = 1e-9
+
+# Each array in the pool, with its dtype and the value of an empty slot.  A
+# sprite with no time to live has NaN, and one with no shooter has -1.
+FIELDS = [
+    ("x", float, 0),
+    ("y", float, 0),
+    ("previous_x", float, 0),
+    ("previous_y", float, 0),
+    ("draw_x", float, 0),
+    ("draw_y", float, 0),
+    ("vx", float, 0),
+    ("vy", float, 0),
+    ("inner_radius", float, 0),
+    ("outer_radius", float, 0),
+    ("time_to_live", float, np.nan),
+    ("shooter_id", int, -1),
+    ("colour_index", int, 0),
+    ("flicker", bool, False),
+    ("active", bool, False),
+    ("terminate", bool, False),
+]
+
+class SpriteView:
+    '''One sprite in a SpritePool.  Its position is given as plain floats (x,
+    y, draw_x and draw_y), which is what the renderer uses.  The Vector2D
+    properties each allocate a new vector, and are only kept for code written
+    against Sprite.  Collision checks read the pool's arrays directly.'''
+    __slots__ = ["pool", "index"]
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+
+    @property
+    def x(self):
+        return self.pool.x[self.index]
+
+    @property
+    def y(self):
+        return self.pool.y[self.index]
+
+    @property
+    def draw_x(self):
+        return self.pool.draw_x[self.index]
+
+    @property
+    def draw_y(self):
+        return self.pool.draw_y[self.index]
+
+    @property
+    def centre_vec(self):
+        return Vector2D(self.pool.x[self.index], self.pool.y[self.index])
+
+    @property
+    def previous_centre_vec(self):
+        return Vector2D(self.pool.previous_x[self.index], self.pool.previous_y[self.index])
+
+    @property
+    def draw_centre_vec(self):
+        return Vector2D(self.pool.draw_x[self.index], self.pool.draw_y[self.index])
+
+    @property
+    def velocity_vec(self):
+        return Vector2D(self.pool.vx[self.index], self.pool.vy[self.index])
+
+    @property
+    def inner_radius(self):
+        return self.pool.inner_radius[self.index]
+
+    @property
+    def outer_radius(self):
+        return self.pool.outer_radius[self.index]
+
+    @property
+    def colour(self):
+        return self.pool.colours[self.pool.colour_index[self.index]]
+
+    @property
+    def flicker(self):
+        return bool(self.pool.flicker[self.index])
+
+    @property
+    def shooter_id(self):
+        shooter_id = self.pool.shooter_id[self.index]
+        return None if shooter_id < 0 else int(shooter_id)
+
+    @property
+    def time_to_live(self):
+        time_to_live = self.pool.time_to_live[self.index]
+        return None if np.isnan(time_to_live) else time_to_live
+
+    @property
+    def terminate(self):
+        return bool(self.pool.terminate[self.index])
+
+    @terminate.setter
+    def terminate(self, terminate):
+        self.pool.terminate[self.index] = terminate
+
+class SpritePool:
+    def __init__(self, capacity=64):
+        # Colours are stored once here, and indexed by colour_index.
+        self.colours = []
+
+        self.capacity = 0
+        self.free_list = []
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        '''Enlarge every array to the given capacity, keeping the existing
+        sprites.'''
+        for name, dtype, empty in FIELDS:
+            array = np.full(capacity, empty, dtype=dtype)
+            if self.capacity > 0:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+
+        # Popped from the end, so the lowest free slot is used first.
+        self.free_list = list(range(capacity - 1, self.capacity - 1, -1)) + self.free_list
+        self.capacity = capacity
+
+    def add(self, x, y, vx, vy, inner_radius, outer_radius, colour, time_to_live=None, flicker=False, shooter_id=None):
+        '''Add a sprite, returning its slot index.'''
+        if not self.free_list:
+            self._grow(2 * self.capacity)
+        i = self.free_list.pop()
+
+        if colour not in self.colours:
+            self.colours.append(colour)
+
+        self.x[i] = self.previous_x[i] = self.draw_x[i] = x
+        self.y[i] = self.previous_y[i] = self.draw_y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.inner_radius[i] = inner_radius
+        self.outer_radius[i] = outer_radius
+        self.time_to_live[i] = np.nan if time_to_live is None else time_to_live
+        self.shooter_id[i] = -1 if shooter_id is None else shooter_id
+        self.colour_index[i] = self.colours.index(colour)
+        self.flicker[i] = flicker
+        self.active[i] = True
+        self.terminate[i] = False
+        return i
+
+    def update(self, dt):
+        '''Move every sprite dt seconds on, and count down times to live.
+        Sprites whose time has run out are marked to terminate.'''
+        self.previous_x[:] = self.x
+        self.previous_y[:] = self.y
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.draw_x[:] = self.x
+        self.draw_y[:] = self.y
+
+        # As for Sprite, a sprite terminates on the update after its time to
+        # live reaches zero.  Comparisons with NaN are false, so sprites
+        # without a time to live are untouched.
+        expired = self.active & (self.time_to_live <= TIME_EPSILON)
+        self.terminate |= expired
+        counting = self.active & (self.time_to_live > TIME_EPSILON)
+        self.time_to_live[counting] -= dt
+
+    def set_draw_time(self, t):
+        '''Draw every sprite where it will be t seconds after its last update.'''
+        np.add(self.x, self.vx * t, out=self.draw_x)
+        np.add(self.y, self.vy * t, out=self.draw_y)
+
+    def remove_terminated(self):
+        terminated = np.flatnonzero(self.active & self.terminate)
+        self.active[terminated] = False
+        self.free_list.extend(terminated[::-1].tolist())
+
+    def get_indices(self):
+        '''Slot indices of the live sprites.'''
+        return np.flatnonzero(self.active)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.active))
+
+    def __iter__(self):
+        return (SpriteView(self, i) for i in self.get_indices())
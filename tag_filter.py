@@ -0,0 +1,85 @@
+'''
+Temporal filtering of tag poses.  The poses coming out of detection are
+independent per-frame measurements, so they jitter, vanish for the odd frame
+and describe where each robot was when the frame was captured rather than
+where it will be when the guidance we draw for it reaches the screen.  Each
+tag id gets an alpha-beta (i.e. fixed-gain constant-velocity) filter on x, y
+and heading, which smooths the jitter, coasts through a few missed detections
+and extrapolates poses to a requested time.
+'''
+
+import numpy as np
+from math import pi
+
+from wow_tag import TagFrame
+
+def wrap_angle(theta):
+    '''Wrap angles (scalar or array) into [-pi, pi).'''
+    return (theta + pi) % (2 * pi) - pi
+
+class AlphaBetaTrack:
+    def __init__(self, pose, time):
+        # pose is [x, y, heading], where the heading is kept unwrapped so that
+        # crossing +/-pi doesn't look like a sudden spin.
+        self.pose = np.array(pose, dtype=float)
+        self.velocity = np.zeros(3)
+        self.time = time
+        self.n_misses = 0
+
+    def update(self, pose, time, alpha, beta):
+        dt = time - self.time
+        predicted = self.pose + self.velocity * dt
+
+        residual = np.array(pose, dtype=float) - predicted
+        residual[2] = wrap_angle(residual[2])
+
+        self.pose = predicted + alpha * residual
+        if dt > 0:
+            self.velocity = self.velocity + beta * residual / dt
+        self.time = time
+        self.n_misses = 0
+
+    def predict(self, time, max_horizon):
+        dt = min(time - self.time, max_horizon)
+        return self.pose + self.velocity * dt
+
+class TagPoseFilter:
+    def __init__(self, alpha=0.5, beta=0.1, max_misses=5, max_horizon=0.25):
+        self.alpha = alpha
+        self.beta = beta
+
+        # A tag is dropped after this many frames in a row without a
+        # detection.  Until then it coasts on its estimated velocity.
+        self.max_misses = max_misses
+
+        # Never extrapolate further ahead than this many seconds.
+        self.max_horizon = max_horizon
+
+        self.track_dict = {}
+
+    def update(self, tag_frame, time):
+        '''Incorporate the tags detected in a frame captured at the given time
+        (in seconds).'''
+        for wow_tag in tag_frame:
+            pose = [wow_tag.x, wow_tag.y, wow_tag.angle]
+            if wow_tag.id in self.track_dict:
+                track = self.track_dict[wow_tag.id]
+                # Measured headings are wrapped; bring this one alongside the
+                # track's unwrapped heading.
+                pose[2] = track.pose[2] + wrap_angle(pose[2] - track.pose[2])
+                track.update(pose, time, self.alpha, self.beta)
+            else:
+                self.track_dict[wow_tag.id] = AlphaBetaTrack(pose, time)
+
+        for id in list(self.track_dict):
+            if id not in tag_frame:
+                self.track_dict[id].n_misses += 1
+                if self.track_dict[id].n_misses > self.max_misses:
+                    self.track_dict.pop(id)
+
+    def predict(self, time):
+        '''A TagFrame of every tracked tag's pose extrapolated to the given
+        time (e.g. when the frame being drawn will actually be on screen).'''
+        ids = np.array(list(self.track_dict), dtype=int)
+        poses = np.array([track.predict(time, self.max_horizon) for track in self.track_dict.values()]).reshape(-1, 3)
+        return TagFrame(ids, poses[:, 0], poses[:, 1], wrap_angle(poses[:, 2]))
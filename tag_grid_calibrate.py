@@ -13,7 +13,7 @@ from scipy import signal
 from wow_tag import WowTag, raw_tags_to_wow_tags
 from config_loader import ConfigLoader
 from tag_grid_panner import TagGridPanner
-from image_processing import capture_and_preprocess, interpolate_missing_values
+from image_processing import capture_and_preprocess, interpolate_missing_values, FusedRemap
 
 if __name__ == "__main__":
 
@@ -44,6 +44,11 @@ if __name__ == "__main__":
         output_corners = [[0, 0], [cfg.output_width-1, 0], [cfg.output_width-1, cfg.output_height-1], [0, cfg.output_height-1]]
         homography, status = cv2.findHomography(np.array(cfg.screen_corners), np.array(output_corners))
 
+    # Preprocess exactly as main.py will, so the calibration matches.
+    remap = None
+    if cfg.use_remap_tables:
+        remap = FusedRemap(cfg, homography=homography)
+
     cap = cv2.VideoCapture(cfg.video_channel)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, cfg.input_width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cfg.input_height)
@@ -62,7 +67,7 @@ if __name__ == "__main__":
         #for tag in reference_tags:
         #    coverage_image[tag.y, tag.x] += 100
 
-        gray_image, warped_image = capture_and_preprocess(cap, cfg, homography=homography)
+        gray_image, warped_image = capture_and_preprocess(cap, cfg, homography=homography, remap=remap)
 
         raw_tags = apriltag_detector.detect(gray_image)
 
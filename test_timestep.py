@@ -0,0 +1,54 @@
+'''
+Checks that the per-second durations in levels.py, counted down a tick at a
+time, last exactly as many ticks as the per-tick counts they replaced: 15 for
+a bullet, 7 between the player's shots and 25 between an enemy's.
+'''
+
+import os
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from levels import Sprite, TICK_RATE, BULLET_TIME_TO_LIVE, PLAYER_FIRE_INTERVAL, ENEMY_FIRE_INTERVAL
+from sprite_pool import SpritePool, TIME_EPSILON
+from utils.vector2d import Vector2D
+
+DT = 1 / TICK_RATE
+
+def count_countdown_ticks(duration):
+    '''Ticks for which a cooldown counted down as in the levels is still
+    running.'''
+    n_ticks = 0
+    while duration > TIME_EPSILON:
+        duration -= DT
+        n_ticks += 1
+    return n_ticks
+
+def test_sprite_lives_15_ticks():
+    sprite = Sprite(Vector2D(0, 0), Vector2D(1, 0), 5, 10, "blue", time_to_live=BULLET_TIME_TO_LIVE)
+    n_ticks = 0
+    while True:
+        sprite.update(DT)
+        if sprite.terminate:
+            break
+        n_ticks += 1
+    assert n_ticks == 15, n_ticks
+
+def test_pool_bullet_lives_15_ticks():
+    pool = SpritePool()
+    pool.add(0, 0, 1, 0, 5, 10, "blue", time_to_live=BULLET_TIME_TO_LIVE)
+    n_ticks = 0
+    while True:
+        pool.update(DT)
+        if pool.terminate.any():
+            break
+        n_ticks += 1
+    assert n_ticks == 15, n_ticks
+
+def test_fire_intervals():
+    assert count_countdown_ticks(PLAYER_FIRE_INTERVAL) == 7
+    assert count_countdown_ticks(ENEMY_FIRE_INTERVAL) == 25
+
+if __name__ == "__main__":
+    test_sprite_lives_15_ticks()
+    test_pool_bullet_lives_15_ticks()
+    test_fire_intervals()
+    print("Bullets live 15 ticks, and shots are 7 and 25 ticks apart.")
@@ -0,0 +1,55 @@
+'''
+Caches for drawing text with pygame.  Looking up a system font is slow, as is
+rendering (and rotating) a string, yet the game screen draws the same few
+strings ("You Win!", tag ids, ...) every frame.  FontRegistry resolves each
+system font once, and TextSurfaceCache keeps recently drawn strings as ready
+to blit surfaces.
+'''
+
+from collections import OrderedDict
+import pygame as pg
+import pygame.freetype
+
+class FontRegistry:
+    def __init__(self, names=()):
+        # One freetype Font per (name, bold).  The size is passed each time we
+        # render, so the same Font serves every size.
+        self.font_dict = {}
+        for name in names:
+            self.get(name, False)
+            self.get(name, True)
+
+    def get(self, name, bold):
+        key = (name, bold)
+        if key not in self.font_dict:
+            self.font_dict[key] = pg.freetype.SysFont(name, 18, bold=bold)
+        return self.font_dict[key]
+
+class TextSurfaceCache:
+    def __init__(self, font_registry, max_entries=256):
+        self.font_registry = font_registry
+        self.max_entries = max_entries
+
+        # Surfaces keyed by (font name, size, bold, text, colour, angle), in
+        # least- to most-recently used order.
+        self.surface_dict = OrderedDict()
+
+    def render(self, text, colour, size, name="arial", bold=False, angle=0):
+        '''Return a surface with the given text rendered (and rotated by angle
+        degrees), rendering it only if it isn't already cached.'''
+        if isinstance(colour, list):
+            colour = tuple(colour)
+        key = (name, size, bold, text, colour, angle)
+        if key in self.surface_dict:
+            self.surface_dict.move_to_end(key)
+            return self.surface_dict[key]
+
+        font = self.font_registry.get(name, bold)
+        surface, _ = font.render(text, colour, size=size)
+        if angle != 0:
+            surface = pg.transform.rotate(surface, angle)
+
+        self.surface_dict[key] = surface
+        if len(self.surface_dict) > self.max_entries:
+            self.surface_dict.popitem(last=False)
+        return surface
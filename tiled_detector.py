@@ -0,0 +1,118 @@
+'''
+Splits each frame into overlapping tiles and detects AprilTags in them with a
+pool of worker processes, so that large output resolutions can use all cores.
+The frame is copied once into a shared memory buffer which the workers read
+from directly, so no image data is pickled.  Tags found in more than one tile
+(i.e. in an overlap) are merged by id and centre.
+'''
+
+import os
+import numpy as np
+from multiprocessing import Pool, resource_tracker, shared_memory
+from pupil_apriltags import Detector
+
+# Per-process state for the workers, set up by _init_worker.
+_worker_detector = None
+_worker_shm = None
+_worker_image = None
+
+def _init_worker():
+    global _worker_detector
+    _worker_detector = Detector(
+       families="tag36h11",
+       nthreads=1,
+       quad_decimate=1.0,
+       quad_sigma=0.0,
+       refine_edges=1,
+       decode_sharpening=0.25,
+       debug=0
+    )
+
+def _detect_tile(shm_name, shape, tile):
+    '''Detect tags within tile = (x0, y0, x1, y1) of the shared frame.'''
+    global _worker_shm, _worker_image
+    if _worker_shm is None or _worker_shm.name != shm_name or _worker_image.shape != shape:
+        # The buffer is (re)created whenever the frame size changes.
+        if _worker_shm is not None:
+            _worker_shm.close()
+        _worker_shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_image = np.ndarray(shape, dtype=np.uint8, buffer=_worker_shm.buf)
+
+    x0, y0, x1, y1 = tile
+    raw_tags = _worker_detector.detect(_worker_image[y0:y1, x0:x1])
+    offset = np.array([x0, y0])
+    for raw_tag in raw_tags:
+        raw_tag.center = raw_tag.center + offset
+        raw_tag.corners = raw_tag.corners + offset
+    return raw_tags
+
+class TiledDetector:
+    def __init__(self, tag_size, n_workers=None, tile_factor=8):
+        # Tiles overlap by two tag widths, so any tag (even rotated by 45
+        # degrees) lies wholly within at least one tile.
+        self.tag_size = tag_size
+        self.overlap = 2 * tag_size
+        self.tile_size = tile_factor * tag_size
+
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+
+        # On POSIX, start the resource tracker before the workers so they
+        # share it.  Otherwise each worker starts its own, which unlinks the
+        # shared buffer when that worker exits.
+        if os.name == "posix":
+            resource_tracker.ensure_running()
+        self.pool = Pool(n_workers, initializer=_init_worker)
+
+        self.shm = None
+        self.shm_image = None
+
+    def get_tiles(self, width, height):
+        '''Return (x0, y0, x1, y1) for each tile covering a width x height
+        image.'''
+        step = self.tile_size - self.overlap
+        tiles = []
+        for y0 in range(0, max(height - self.overlap, 1), step):
+            for x0 in range(0, max(width - self.overlap, 1), step):
+                tiles.append((x0, y0, min(x0 + self.tile_size, width), min(y0 + self.tile_size, height)))
+        return tiles
+
+    def detect(self, gray_image):
+        '''Drop-in replacement for Detector.detect.'''
+        if self.shm_image is None or self.shm_image.shape != gray_image.shape:
+            self._release_shm()
+            self.shm = shared_memory.SharedMemory(create=True, size=gray_image.nbytes)
+            self.shm_image = np.ndarray(gray_image.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.shm_image[:] = gray_image
+
+        height, width = gray_image.shape
+        args = [(self.shm.name, gray_image.shape, tile) for tile in self.get_tiles(width, height)]
+        tile_tags = self.pool.starmap(_detect_tile, args)
+
+        return self._merge([raw_tag for raw_tags in tile_tags for raw_tag in raw_tags])
+
+    def _merge(self, raw_tags):
+        '''Drop duplicates of the same tag found in overlapping tiles, keeping
+        the most confidently decoded one.  Two detections are the same tag if
+        they have the same id and their centres are within half a tag width.'''
+        merged = []
+        for raw_tag in sorted(raw_tags, key=lambda tag: -tag.decision_margin):
+            duplicate = False
+            for kept in merged:
+                if kept.tag_id == raw_tag.tag_id and np.hypot(*(kept.center - raw_tag.center)) < self.tag_size / 2:
+                    duplicate = True
+                    break
+            if not duplicate:
+                merged.append(raw_tag)
+        return merged
+
+    def _release_shm(self):
+        if self.shm is not None:
+            self.shm_image = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        self.pool.terminate()
+        self._release_shm()
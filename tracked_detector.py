@@ -0,0 +1,133 @@
+'''
+Wraps an AprilTag Detector so that most frames only search small windows
+around where each tag is predicted to be, rather than the whole image.  The
+robots are a handful of tags that move slowly, so detection cost then scales
+with the number of robots instead of the screen area.
+
+The windows are packed side-by-side into one mosaic image so that all of them
+are searched in a single detect() call.  A full-frame scan is done every
+full_scan_interval frames (to pick up newly-arrived tags) and whenever a
+tracked tag goes missing from its window.
+'''
+
+import numpy as np
+
+class TrackedDetector:
+    def __init__(self, detector, window_radius=100, full_scan_interval=15, gap=8):
+        self.detector = detector
+        self.window_radius = window_radius
+        self.full_scan_interval = full_scan_interval
+
+        # Black columns between windows in the mosaic so that nothing can be
+        # detected across a seam.
+        self.gap = gap
+
+        # The last two observed centres (in image coordinates) for each tag id.
+        self.track_dict = {}
+        self.frames_since_full_scan = 0
+
+        # Counters, handy for checking how often we fall back.
+        self.n_full_scans = 0
+        self.n_window_scans = 0
+
+    def detect(self, gray_image):
+        '''Drop-in replacement for Detector.detect.  Returns the raw tags with
+        centres and corners in the coordinates of gray_image.'''
+        predictions = self._predict()
+
+        raw_tags = None
+        if predictions and self.frames_since_full_scan < self.full_scan_interval:
+            raw_tags = detect_in_windows(self.detector, gray_image, predictions.values(),
+                                         self.window_radius, self.gap)
+            found_ids = set(raw_tag.tag_id for raw_tag in raw_tags)
+            if all(id in found_ids for id in predictions):
+                self.n_window_scans += 1
+                self.frames_since_full_scan += 1
+            else:
+                # A tag was lost.  Search everywhere.
+                raw_tags = None
+
+        if raw_tags is None:
+            raw_tags = self.detector.detect(gray_image)
+            self.n_full_scans += 1
+            self.frames_since_full_scan = 0
+
+        self._update_tracks(raw_tags)
+        return raw_tags
+
+    def _predict(self):
+        '''Constant-velocity prediction of each tracked tag's centre.'''
+        predictions = {}
+        for id, track in self.track_dict.items():
+            if len(track) == 1:
+                predictions[id] = track[-1]
+            else:
+                predictions[id] = 2 * track[-1] - track[-2]
+        return predictions
+
+    def _update_tracks(self, raw_tags):
+        # Only tags seen this frame are tracked.  Anything else will be
+        # rediscovered by the next full scan.
+        new_track_dict = {}
+        for raw_tag in raw_tags:
+            centre = np.array(raw_tag.center, dtype=float)
+            if raw_tag.tag_id in self.track_dict:
+                new_track_dict[raw_tag.tag_id] = [self.track_dict[raw_tag.tag_id][-1], centre]
+            else:
+                new_track_dict[raw_tag.tag_id] = [centre]
+        self.track_dict = new_track_dict
+
+def get_window_radius(cfg, warped, tag_widths=2.0):
+    '''A window radius for detect_in_windows, from the size of the tags drawn
+    on screen (cfg.tg_tag_size, in output pixels) in the image searched.  If
+    that image is warped it is output-sized, otherwise it is the captured
+    frame, across which the screen spans cfg.screen_corners.  The window
+    reaches tag_widths tag widths either side of the predicted centre, which
+    leaves room for the tag's corners and for error in the prediction.'''
+    tag_size = cfg.tg_tag_size
+    if not warped:
+        upper_left, upper_right, lower_right, lower_left = np.array(cfg.screen_corners, dtype=float)
+        screen_width = (np.hypot(*(upper_right - upper_left)) + np.hypot(*(lower_right - lower_left))) / 2
+        tag_size *= screen_width / cfg.output_width
+    return int(np.ceil(tag_widths * tag_size))
+
+def detect_in_windows(detector, gray_image, centres, window_radius, gap=8):
+    '''Run detector over square windows of the given radius around each of
+    the given (x, y) centres.  The windows are packed side-by-side, separated
+    by gap black columns, into one mosaic image so that only a single detect()
+    call is needed.  Returns raw tags (at most one per id) with centres and
+    corners in the coordinates of gray_image.'''
+    h, w = gray_image.shape[:2]
+    r = window_radius
+    size = 2 * r
+
+    # Top-left corner of each window, clamped to lie within the image.
+    origins = []
+    for cx, cy in centres:
+        x0 = int(min(max(cx - r, 0), max(w - size, 0)))
+        y0 = int(min(max(cy - r, 0), max(h - size, 0)))
+        origins.append((x0, y0))
+    if not origins:
+        return []
+
+    mosaic = np.zeros((size, len(origins) * (size + gap)), dtype=gray_image.dtype)
+    for i, (x0, y0) in enumerate(origins):
+        window = gray_image[y0:y0+size, x0:x0+size]
+        mx = i * (size + gap)
+        mosaic[:window.shape[0], mx:mx+window.shape[1]] = window
+
+    raw_tags = []
+    found_ids = set()
+    for raw_tag in detector.detect(mosaic):
+        i = int(raw_tag.center[0]) // (size + gap)
+        if i >= len(origins) or raw_tag.tag_id in found_ids:
+            # Overlapping windows can contain the same tag twice.
+            continue
+        x0, y0 = origins[i]
+        offset = np.array([x0 - i * (size + gap), y0])
+        raw_tag.center = raw_tag.center + offset
+        raw_tag.corners = raw_tag.corners + offset
+        raw_tags.append(raw_tag)
+        found_ids.add(raw_tag.tag_id)
+
+    return raw_tags
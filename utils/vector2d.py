@@ -5,8 +5,13 @@ via pip but placing it here to avoid the surprise that its missing.
 
 import math
 import random
+import numpy as np
 
 class Vector2D(object):
+    # Vectors are created in great numbers in the game's per-frame loops, so
+    # they carry no __dict__.
+    __slots__ = ("x", "y")
+
     def __init__(self, _x, _y):
         self.x = _x
         self.y = _y
@@ -24,32 +29,18 @@ class Vector2D(object):
         return Vector2D(1,1)
     
     def __add__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = self.x + other.x
-            newY = self.y + other.y
+            return Vector2D(self.x + other.x, self.y + other.y)
         elif isinstance(other, (int, float)):
-            newX = self.x + other
-            newY = self.y + other
-        else:
-            
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x + other, self.y + other)
+        return NotImplemented
     
     def __radd__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x + self.x
-            newY = other.y + self.y
+            return Vector2D(other.x + self.x, other.y + self.y)
         elif isinstance(other, (int, float)):
-            newX = other + self.x
-            newY = other + self.y
-        else:
-            
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other + self.x, other + self.y)
+        return NotImplemented
     
     def __iadd__(self, other):
         if isinstance(other, Vector2D):
@@ -63,30 +54,18 @@ class Vector2D(object):
         return self
     
     def __sub__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = self.x - other.x
-            newY = self.y - other.y
+            return Vector2D(self.x - other.x, self.y - other.y)
         elif isinstance(other, (int, float)):
-            newX = self.x - other
-            newY = self.y - other
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x - other, self.y - other)
+        return NotImplemented
     
     def __rsub__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x - self.x
-            newY = other.y - self.y
+            return Vector2D(other.x - self.x, other.y - self.y)
         elif isinstance(other, (int, float)):
-            newX = other - self.x
-            newY = other - self.y
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other - self.x, other - self.y)
+        return NotImplemented
     
     def __isub__(self, other):
         if isinstance(other, Vector2D):
@@ -100,30 +79,18 @@ class Vector2D(object):
         return self
     
     def __mul__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = self.x * other.x
-            newY = self.y * other.y
+            return Vector2D(self.x * other.x, self.y * other.y)
         elif isinstance(other, (int, float)):
-            newX = self.x * other
-            newY = self.y * other
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x * other, self.y * other)
+        return NotImplemented
     
     def __rmul__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x * self.x
-            newY = other.y * self.y
+            return Vector2D(other.x * self.x, other.y * self.y)
         elif isinstance(other, (int, float)):
-            newX = other * self.x
-            newY = other * self.y
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other * self.x, other * self.y)
+        return NotImplemented
     
     def __imul__(self, other):
         if isinstance(other, Vector2D):
@@ -137,56 +104,32 @@ class Vector2D(object):
         return self
     
     def __truediv__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = self.x / other.x
-            newY = self.y / other.y
+            return Vector2D(self.x / other.x, self.y / other.y)
         elif isinstance(other, (int, float)):
-            newX = self.x / other
-            newY = self.y / other
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x / other, self.y / other)
+        return NotImplemented
     
     def __rtruediv__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x / self.x
-            newY = other.y / self.y
+            return Vector2D(other.x / self.x, other.y / self.y)
         elif isinstance(other, (int, float)):
-            newX = other / self.x
-            newY = other / self.y
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other / self.x, other / self.y)
+        return NotImplemented
     
     def __floordiv__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = self.x // other.x
-            newY = self.y // other.y
+            return Vector2D(self.x // other.x, self.y // other.y)
         elif isinstance(other, (int, float)):
-            newX = self.x // other
-            newY = self.y // other
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x // other, self.y // other)
+        return NotImplemented
     
     def __rfloordiv__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x // self.x
-            newY = other.y // self.y
+            return Vector2D(other.x // self.x, other.y // self.y)
         elif isinstance(other, (int, float)):
-            newX = other // self.x
-            newY = other // self.y
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other // self.x, other // self.y)
+        return NotImplemented
     
     def __itruediv__(self, other):
         if isinstance(other, Vector2D):
@@ -211,56 +154,33 @@ class Vector2D(object):
         return self
     
     def __pow__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, (int, float)):
-            newX = self.x ** other
-            newY = self.y ** other
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x ** other, self.y ** other)
+        return NotImplemented
     
     def __rpow__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x ** self.x
-            newY = other.y ** self.y
+            return Vector2D(other.x ** self.x, other.y ** self.y)
         elif isinstance(other, (int, float)):
-            newX = other ** self.x
-            newY = other ** self.y
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other ** self.x, other ** self.y)
+        return NotImplemented
     
     def __neg__(self):
         return Vector2D(-self.x, -self.y)
     
     def __mod__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = self.x % other.x
-            newY = self.y % other.y
+            return Vector2D(self.x % other.x, self.y % other.y)
         elif isinstance(other, (int, float)):
-            newX = self.x % other
-            newY = self.y % other
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(self.x % other, self.y % other)
+        return NotImplemented
     
     def __rmod__(self, other):
-        newX = 0
-        newY = 0
         if isinstance(other, Vector2D):
-            newX = other.x % self.x
-            newY = other.y % self.y
+            return Vector2D(other.x % self.x, other.y % self.y)
         elif isinstance(other, (int, float)):
-            newX = other % self.x
-            newY = other % self.y
-        else:
-            return NotImplemented
-        return Vector2D(newX, newY)
+            return Vector2D(other % self.x, other % self.y)
+        return NotImplemented
     
     def __eq__(self, other):
         if isinstance(other, Vector2D):
@@ -306,7 +226,7 @@ class Vector2D(object):
 
     @property
     def length(self):
-        return math.sqrt((self.x ** 2) + (self.y ** 2))
+        return math.hypot(self.x, self.y)
 
     __len__ = length.fget
     
@@ -322,7 +242,7 @@ class Vector2D(object):
     @staticmethod
     def Distance(a, b):
         # (b-a).length
-        return math.sqrt(((b.x-a.x)**2)+((b.y-a.y)**2))
+        return math.hypot(b.x - a.x, b.y - a.y)
     
     @staticmethod
     def Lerp(a, b, t):
@@ -419,4 +339,127 @@ class Vector2D(object):
                 else:
                     return None
             else:
-                return None
\ No newline at end of file
+                return None
+
+
+class Vector2DArray(object):
+    '''A batch of 2D vectors held as an (n, 2) NumPy array, with vectorized
+    versions of Vector2D's common operations.  The other operand of an
+    arithmetic operator may be a Vector2DArray of the same length, a single
+    Vector2D, a number, or an array of n numbers (one per vector).'''
+    __slots__ = ("xy",)
+
+    def __init__(self, xy):
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+
+    @staticmethod
+    def FromVectors(vectors):
+        return Vector2DArray([(v.x, v.y) for v in vectors])
+
+    @staticmethod
+    def _operand(other):
+        if isinstance(other, Vector2DArray):
+            return other.xy
+        elif isinstance(other, Vector2D):
+            return np.array([other.x, other.y])
+        elif isinstance(other, (int, float)):
+            return other
+        elif isinstance(other, np.ndarray) and other.ndim == 1:
+            return other[:, np.newaxis]
+        return None
+
+    @property
+    def x(self):
+        return self.xy[:, 0]
+
+    @property
+    def y(self):
+        return self.xy[:, 1]
+
+    def __len__(self):
+        return len(self.xy)
+
+    def __getitem__(self, i):
+        return Vector2D(self.xy[i, 0], self.xy[i, 1])
+
+    def __iter__(self):
+        return (Vector2D(x, y) for x, y in self.xy.tolist())
+
+    def __add__(self, other):
+        other = Vector2DArray._operand(other)
+        return NotImplemented if other is None else Vector2DArray(self.xy + other)
+
+    __radd__ = __add__
+
+    def __iadd__(self, other):
+        other = Vector2DArray._operand(other)
+        if other is None:
+            return NotImplemented
+        self.xy += other
+        return self
+
+    def __sub__(self, other):
+        other = Vector2DArray._operand(other)
+        return NotImplemented if other is None else Vector2DArray(self.xy - other)
+
+    def __rsub__(self, other):
+        other = Vector2DArray._operand(other)
+        return NotImplemented if other is None else Vector2DArray(other - self.xy)
+
+    def __isub__(self, other):
+        other = Vector2DArray._operand(other)
+        if other is None:
+            return NotImplemented
+        self.xy -= other
+        return self
+
+    def __mul__(self, other):
+        other = Vector2DArray._operand(other)
+        return NotImplemented if other is None else Vector2DArray(self.xy * other)
+
+    __rmul__ = __mul__
+
+    def __imul__(self, other):
+        other = Vector2DArray._operand(other)
+        if other is None:
+            return NotImplemented
+        self.xy *= other
+        return self
+
+    def __truediv__(self, other):
+        other = Vector2DArray._operand(other)
+        return NotImplemented if other is None else Vector2DArray(self.xy / other)
+
+    def __neg__(self):
+        return Vector2DArray(-self.xy)
+
+    @property
+    def length(self):
+        return np.hypot(self.xy[:, 0], self.xy[:, 1])
+
+    def getNormalised(self):
+        # As for Vector2D, zero vectors stay zero.
+        length = self.length
+        length[length == 0] = 1
+        return Vector2DArray(self.xy / length[:, np.newaxis])
+
+    def rotate(self, angle):
+        '''Rotate each vector anticlockwise by angle radians (a number, or an
+        array with one angle per vector).'''
+        c = np.cos(angle)
+        s = np.sin(angle)
+        x, y = self.xy[:, 0], self.xy[:, 1]
+        return Vector2DArray(np.column_stack([c * x - s * y, s * x + c * y]))
+
+    @staticmethod
+    def Distance(a, b):
+        '''Distances between corresponding vectors of a and b, either of which
+        may also be a single Vector2D.'''
+        d = Vector2DArray._operand(b) - Vector2DArray._operand(a)
+        d = np.atleast_2d(d)
+        return np.hypot(d[:, 0], d[:, 1])
+
+    @staticmethod
+    def DotProduct(a, b):
+        d = np.atleast_2d(Vector2DArray._operand(a) * Vector2DArray._operand(b))
+        return d[:, 0] + d[:, 1]
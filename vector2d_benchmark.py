@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+'''
+Times the vector operations used in the game loops (adding, scaling, distance
+and normalising) for utils.vector2d.Vector2D, pygame's Vector2, and a single
+Vector2DArray holding all the vectors.
+'''
+
+import sys, timeit
+import numpy as np
+from pygame.math import Vector2
+
+from utils.vector2d import Vector2D, Vector2DArray
+
+def time_per_vector(stmt, n_vectors, number):
+    '''Best time in nanoseconds per vector for running stmt over n_vectors.'''
+    times = timeit.repeat(stmt, number=number, repeat=5)
+    return 1e9 * min(times) / (number * n_vectors)
+
+if __name__ == "__main__":
+
+    n_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    number = 20
+
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 1000, (n_vectors, 2))
+    velocity_xy = rng.uniform(-20, 20, (n_vectors, 2))
+    target = (500.0, 300.0)
+
+    vectors = [Vector2D(x, y) for x, y in xy.tolist()]
+    velocities = [Vector2D(x, y) for x, y in velocity_xy.tolist()]
+    target_vector = Vector2D(*target)
+
+    pg_vectors = [Vector2(x, y) for x, y in xy.tolist()]
+    pg_velocities = [Vector2(x, y) for x, y in velocity_xy.tolist()]
+    pg_target = Vector2(*target)
+
+    array = Vector2DArray(xy)
+    velocity_array = Vector2DArray(velocity_xy)
+
+    benchmarks = {
+        "add and scale": (
+            lambda: [p + v * 0.5 for p, v in zip(vectors, velocities)],
+            lambda: [p + v * 0.5 for p, v in zip(pg_vectors, pg_velocities)],
+            lambda: array + velocity_array * 0.5),
+        "distance": (
+            lambda: [Vector2D.Distance(p, target_vector) for p in vectors],
+            lambda: [p.distance_to(pg_target) for p in pg_vectors],
+            lambda: Vector2DArray.Distance(array, target_vector)),
+        "normalise": (
+            lambda: [p.getNormalised() for p in vectors],
+            lambda: [p.normalize() for p in pg_vectors],
+            lambda: array.getNormalised()),
+    }
+
+    print(f"ns per vector, over {n_vectors} vectors")
+    print(f"{'':16}{'Vector2D':>12}{'pygame':>12}{'array':>12}")
+    for name, (vector2d_stmt, pygame_stmt, array_stmt) in benchmarks.items():
+        times = [time_per_vector(stmt, n_vectors, number) for stmt in (vector2d_stmt, pygame_stmt, array_stmt)]
+        print(f"{name:16}" + "".join(f"{t:12.1f}" for t in times))
@@ -3,9 +3,12 @@ A WowTag (will-o-wisp tag) is distinct from one of the tags produced by
 Apriltags.
 '''
 
+import numpy as np
 from math import atan2, pi
 
 class WowTag:
+    __slots__ = ["id", "x", "y", "angle"]
+
     def __init__(self, id, x, y, angle):
         self.id = id
         self.x = x
@@ -14,55 +17,152 @@ class WowTag:
     def __str__(self):
         return f"{self.id}, {self.x}, {self.y}, {self.angle}"
 
-def apply_tg_calibration_to_raw_tags(raw_tags, tg_calib_count, tg_calib_x, tg_calib_y):
+# Counts of tags dropped by the tag grid calibration, by reason.  These replace
+# printing a message for every rejection.
+tg_calib_rejection_counts = {"no_data": 0, "out_of_bounds": 0}
+
+def raw_tags_to_tag_arrays(raw_tags):
+    '''Stack the ids of these raw apriltags into an (n,) array and their
+    centres and corners into an (n, 5, 2) array, with the centre first.'''
+    ids = np.array([raw_tag.tag_id for raw_tag in raw_tags], dtype=int)
+    points = np.empty((len(raw_tags), 5, 2))
+    for i, raw_tag in enumerate(raw_tags):
+        points[i, 0] = raw_tag.center
+        points[i, 1:] = raw_tag.corners
+    return ids, points
+
+def _sample_grid(grid, x, y, bilinear):
+    '''Look up grid (indexed [y, x]) at the given arrays of positions, which
+    must lie within the grid.'''
+    h, w = grid.shape
+    if not bilinear:
+        return grid[y.astype(int), x.astype(int)]
+
+    x0 = np.clip(np.floor(x).astype(int), 0, w - 2)
+    y0 = np.clip(np.floor(y).astype(int), 0, h - 2)
+    fx = np.clip(x - x0, 0, 1)
+    fy = np.clip(y - y0, 0, 1)
+    top = (1 - fx) * grid[y0, x0] + fx * grid[y0, x0 + 1]
+    bottom = (1 - fx) * grid[y0 + 1, x0] + fx * grid[y0 + 1, x0 + 1]
+    return (1 - fy) * top + fy * bottom
+
+def apply_tg_calibration_to_tag_arrays(ids, points, tg_calib_count, tg_calib_x, tg_calib_y, bilinear=False):
+    '''Apply tag grid calibration data to the centres and corners of tags
+    given as arrays (see raw_tags_to_tag_arrays), all in one gather.  Tags
+    whose centre has no calibration data (or falls outside the grid) are
+    dropped and counted in tg_calib_rejection_counts.  With bilinear, the
+    calibration grids are interpolated rather than sampled at the truncated
+    position.  Returns the (ids, points) of the tags kept.'''
+    h, w = tg_calib_count.shape
+    x = points[:, :, 0]
+    y = points[:, :, 1]
+
+    in_bounds = (x[:, 0] >= 0) & (x[:, 0] < w) & (y[:, 0] >= 0) & (y[:, 0] < h)
+    tg_calib_rejection_counts["out_of_bounds"] += int(np.count_nonzero(~in_bounds))
+
+    # Corners of an in-bounds tag may poke slightly outside, so clamp them.
+    x = np.clip(x[in_bounds], 0, w - 1)
+    y = np.clip(y[in_bounds], 0, h - 1)
+    ids = ids[in_bounds]
+
+    has_data = tg_calib_count[y[:, 0].astype(int), x[:, 0].astype(int)] != 0
+    tg_calib_rejection_counts["no_data"] += int(np.count_nonzero(~has_data))
+    x = x[has_data]
+    y = y[has_data]
+
+    calibrated = np.empty((len(x), 5, 2))
+    calibrated[:, :, 0] = _sample_grid(tg_calib_x, x, y, bilinear)
+    calibrated[:, :, 1] = _sample_grid(tg_calib_y, x, y, bilinear)
+    return ids[has_data], calibrated
+
+def apply_tg_calibration_to_raw_tags(raw_tags, tg_calib_count, tg_calib_x, tg_calib_y, bilinear=False):
     '''Apply tag grid calibration data to the center and corners of these
     raw apriltags.  Returns the calibrated tags, excluding any where needed
     calibration data is missing.'''
-    calibrated_tags = []
-    for raw_tag in raw_tags:
-
-        index = int(raw_tag.center[1]), int(raw_tag.center[0])
-        if tg_calib_count[index] == 0:
-            print("Rejected center.")
-            continue
+    _, points = raw_tags_to_tag_arrays(raw_tags)
 
-        raw_tag.center[0] = tg_calib_x[index]
-        raw_tag.center[1] = tg_calib_y[index]
+    # Pass indices in place of ids, so the results can be matched back up.
+    indices = np.arange(len(raw_tags))
+    kept_indices, calibrated = apply_tg_calibration_to_tag_arrays(indices, points, tg_calib_count, tg_calib_x, tg_calib_y, bilinear)
 
-        valid = True
-        for corner_i in range(4):
-            index = int(raw_tag.corners[corner_i, 1]), int(raw_tag.corners[corner_i, 0])
-            #if tg_calib_count[index] == 0:
-            #    print("Rejected corner.")
-            #    valid = False
-            #    break
-
-            raw_tag.corners[corner_i, 0] = tg_calib_x[index]
-            raw_tag.corners[corner_i, 1] = tg_calib_y[index]
-
-        if valid:
-            calibrated_tags.append(raw_tag)
+    calibrated_tags = []
+    for i, index in enumerate(kept_indices):
+        raw_tag = raw_tags[index]
+        raw_tag.center = calibrated[i, 0]
+        raw_tag.corners = calibrated[i, 1:]
+        calibrated_tags.append(raw_tag)
 
     return calibrated_tags
 
-def raw_tags_to_wow_tags(raw_tags):
-    wow_tags = []
-    for raw_tag in raw_tags:
-        cx = int(raw_tag.center[0])
-        cy = int(raw_tag.center[1])
-        #cv2.circle(raw_image, (cx, cy), 10, (255,0,255), thickness=5)
-
-        # Estimate the angle, choosing corner 1 as the origin and corner 0
-        # as being in the forwards direction, relative to corner 1.
-        x = raw_tag.corners[0,0] - raw_tag.corners[1,0]
-        y = raw_tag.corners[0,1] - raw_tag.corners[1,1]
-        tag_angle = atan2(y, x) + pi/2
-        #cv2.putText(raw_image, str(theta), (cx, cy), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
-
-        wow_tag = WowTag(raw_tag.tag_id, cx, cy, tag_angle)
-        wow_tags.append(wow_tag)
-    return wow_tags
-
+class TagFrame:
+    '''All of the tags seen in one frame, stored as parallel arrays of id, x,
+    y and angle, with an index from id to row for O(1) lookup.  Iterating
+    gives WowTag views, so a TagFrame can be used wherever a list of WowTags
+    was.  The views are created once per frame, so the same WowTag object is
+    returned each time for a given tag.'''
+    def __init__(self, ids, x, y, angles):
+        self.ids = ids
+        self.x = x
+        self.y = y
+        self.angles = angles
+        self.index = {int(id): row for row, id in enumerate(ids)}
+        self._views = None
+
+    @classmethod
+    def from_tag_arrays(cls, ids, points):
+        '''Build from the arrays produced by raw_tags_to_tag_arrays.'''
+        # As in raw_tags_to_wow_tags, corner 0 is forwards of corner 1.
+        forwards = points[:, 1] - points[:, 2]
+        angles = np.arctan2(forwards[:, 1], forwards[:, 0]) + pi/2
+        return cls(ids, points[:, 0, 0].astype(int), points[:, 0, 1].astype(int), angles)
+
+    @classmethod
+    def from_raw_tags(cls, raw_tags):
+        return cls.from_tag_arrays(*raw_tags_to_tag_arrays(raw_tags))
+
+    def _get_views(self):
+        if self._views is None:
+            self._views = [WowTag(id, x, y, angle) for id, x, y, angle in
+                           zip(self.ids.tolist(), self.x.tolist(), self.y.tolist(), self.angles.tolist())]
+        return self._views
+
+    def __iter__(self):
+        return iter(self._get_views())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def get(self, id):
+        '''The WowTag with this id, or None if it wasn't seen.'''
+        row = self.index.get(id)
+        if row is None:
+            return None
+        return self._get_views()[row]
+
+    def rows(self):
+        '''(id, x, y, angle) for each tag as plain Python values, for loops
+        that only need the numbers and not WowTag views.'''
+        return zip(self.ids.tolist(), self.x.tolist(), self.y.tolist(), self.angles.tolist())
+
+    def unique(self):
+        '''This frame with one tag per id, the one index maps the id to (the
+        last detected), as a dict keyed by id would keep.'''
+        if len(self.index) == len(self.ids):
+            return self
+        rows = np.array(sorted(self.index.values()), dtype=int)
+        return TagFrame(self.ids[rows], self.x[rows], self.y[rows], self.angles[rows])
+
+    def without(self, id):
+        '''A new TagFrame with the tag of this id (if any) removed.'''
+        keep = self.ids != id
+        return TagFrame(self.ids[keep], self.x[keep], self.y[keep], self.angles[keep])
+
+    def positions(self):
+        '''An (n, 2) array of tag centres.'''
+        return np.stack([self.x, self.y], axis=1)
 
 def raw_tags_to_wow_tags(raw_tags):
     wow_tags = []
@@ -81,3 +181,4 @@ def raw_tags_to_wow_tags(raw_tags):
         wow_tag = WowTag(raw_tag.tag_id, cx, cy, tag_angle)
         wow_tags.append(wow_tag)
     return wow_tags
+